@@ -8,7 +8,28 @@
 import os
 import json
 import argparse
-import glob
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson 解析速度显著快于标准库 json，未安装时退回 json.loads
+try:
+    import orjson
+
+    def json_loads(raw):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson 不接受 NaN/Infinity 和超出 64 位的整数，标准库可以解析，退回 json.loads
+            return json.loads(raw)
+except ImportError:
+    json_loads = json.loads
+
+def set_field(obj, key, value):
+    """obj[key] 与 value 不同时更新，返回是否发生了修改"""
+    if key in obj and obj[key] == value:
+        return False
+    obj[key] = value
+    return True
 
 def update_json_file(json_file_path, replacements, label_updates):
     """
@@ -16,65 +37,87 @@ def update_json_file(json_file_path, replacements, label_updates):
     :param json_file_path: 文件路径
     :param replacements: 用于替换 'xxx' 的字典
     :param label_updates: 用于添加/更新 'label' 字段的字典
+    :return: 文件内容是否发生变化并被写回
     """
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        is_modified = False
+        with open(json_file_path, 'rb') as f:
+            raw = f.read()
+        data = json_loads(raw)
+        # 只记录实际改动的字段，无需重新解析或整体比较即可判断内容是否变化
+        changed = False
 
         # --- 功能 1: 替换现有的 'xxx' 字段 ---
         
         # 更新 project_info
         if 'project_info' in data and 'project_name' in data['project_info']:
             if data['project_info']['project_name'] is not None and 'pname' in replacements:
-                data['project_info']['project_name'] = replacements['pname']
-                is_modified = True
+                changed |= set_field(data['project_info'], 'project_name', replacements['pname'])
 
         # 更新 task_info
         if 'task_info' in data:
             if 'task_name' in data['task_info'] and data['task_info']['task_name'] is not None and 'tname' in replacements:
-                data['task_info']['task_name'] = replacements['tname']
-                is_modified = True
+                changed |= set_field(data['task_info'], 'task_name', replacements['tname'])
             if 'task_owner' in data['task_info'] and data['task_info']['task_owner'] is not None and 'towner' in replacements:
-                data['task_info']['task_owner'] = replacements['towner']
-                is_modified = True
+                changed |= set_field(data['task_info'], 'task_owner', replacements['towner'])
 
         # 更新 operation_info
         if 'operation_info' in data and 'operator_name' in data['operation_info']:
             if data['operation_info']['operator_name'] is not None and 'opname' in replacements:
-                data['operation_info']['operator_name'] = replacements['opname']
-                is_modified = True
+                changed |= set_field(data['operation_info'], 'operator_name', replacements['opname'])
 
         # --- 功能 2: 添加或更新 label 字段 ---
         
         if label_updates:
-            # 如果 'label' 键不存在，初始化为空字典
             if 'label' not in data:
                 data['label'] = {}
-                is_modified = True # 新建了 label 肯定算修改
-            
-            # 遍历需要更新的标签
+                changed = True
             for key, value in label_updates.items():
-                # 只有当值不为空，且当前值与新值不同时才写入
                 if value is not None:
-                    # 如果原先没有这个key，或者值不一样，则更新
-                    if key not in data['label'] or data['label'][key] != value:
-                        data['label'][key] = value
-                        is_modified = True
-
-        # 只有在发生修改时才写回文件
-        if is_modified:
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-            return True
-        else:
+                    changed |= set_field(data['label'], key, value)
+
+        # 内容未变化时跳过写入 (幂等重跑不产生写操作)
+        if not changed:
             return False
 
+        # 先写临时文件再原子替换，避免中断时留下写了一半的文件
+        # 符号链接写到其指向的文件，并保留原文件的权限位
+        target_path = os.path.realpath(json_file_path)
+        tmp_path = target_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8'))
+        shutil.copymode(target_path, tmp_path)
+        os.replace(tmp_path, target_path)
+        return True
+
     except Exception as e:
         print(f"处理文件 {json_file_path} 时出错: {e}")
         return False
 
+def iter_json_files(root_dir):
+    """
+    递归遍历目录，逐个产出 JSON 文件路径
+    与 glob('**/*.json', recursive=True) 一致地跳过以 '.' 开头的隐藏文件和目录
+    """
+    # 无法读取或扫描期间被删除的目录只打印警告并跳过，不中断整个处理
+    try:
+        with os.scandir(root_dir) as it:
+            entries = list(it)
+    except OSError as e:
+        print(f"Warning: Failed to scan {root_dir}: {e}")
+        return
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+        try:
+            is_dir = entry.is_dir()
+        except OSError as e:
+            print(f"Warning: Failed to stat {entry.path}: {e}")
+            continue
+        if is_dir:
+            yield from iter_json_files(entry.path)
+        elif entry.name.endswith('.json') and entry.is_file():
+            yield entry.path
+
 def main():
     parser = argparse.ArgumentParser(description='批量化处理Galaxea数据集JSON：替换xxx字段及添加Label标签')
     
@@ -93,6 +136,7 @@ def main():
     
     # 通用参数
     parser.add_argument('--dir', type=str, default='.', help='要处理的文件夹路径 (默认: 当前目录)')
+    parser.add_argument('--workers', type=int, default=32, help='并行处理的线程数 (默认: 32)')
 
     args = parser.parse_args()
 
@@ -115,29 +159,33 @@ def main():
     if not replacements and not label_updates:
         parser.error("至少需要提供一个替换参数 (--pname等) 或 一个标签参数 (--temporal等)")
 
-    # 查找所有JSON文件
-    search_pattern = os.path.join(args.dir, '**', '*.json')
-    json_files = glob.glob(search_pattern, recursive=True)
-
-    if not json_files:
-        print(f"在目录 {args.dir} 下未找到JSON文件")
-        return
-
-    print(f"找到 {len(json_files)} 个JSON文件需要处理")
     if replacements:
         print(f"替换操作: {replacements}")
     if label_updates:
         print(f"打标操作: {label_updates}")
 
-    # 处理每个JSON文件
-    success_count = 0
-    for json_file in json_files:
-        # print(f"正在检查: {json_file}") # 可选：如果文件太多可以注释掉这行
-        if update_json_file(json_file, replacements, label_updates):
-            print(f"已修改: {json_file}")
-            success_count += 1
+    if not os.path.isdir(args.dir):
+        print(f"在目录 {args.dir} 下未找到JSON文件")
+        return
+
+    # 边扫描边提交处理 (文件读写为IO密集型，使用线程池并行)
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        for json_file in iter_json_files(args.dir):
+            futures.append((json_file, executor.submit(update_json_file, json_file, replacements, label_updates)))
+
+        if not futures:
+            print(f"在目录 {args.dir} 下未找到JSON文件")
+            return
+
+        print(f"找到 {len(futures)} 个JSON文件需要处理")
+        success_count = 0
+        for json_file, future in futures:
+            if future.result():
+                print(f"已修改: {json_file}")
+                success_count += 1
 
-    print(f"\n处理完成! 共修改了 {success_count} 个文件 (总计扫描 {len(json_files)} 个)")
+    print(f"\n处理完成! 共修改了 {success_count} 个文件 (总计扫描 {len(futures)} 个)")
 
 """
 使用方法示例:
@@ -31,19 +31,37 @@ Notes:
 - metadata.yaml must contain starting_time.nanoseconds_since_epoch (or files[0].starting_time...)
 - For depth images: filenames are assumed numeric (e.g. 000001.png). Script tries to detect padding and 0/1 base.
 - For depth video: use --depth_is_video flag, output will also be a video file.
+  Lossless 16-bit depth (record.py --lossless-depth, FFV1 .mkv) stays FFV1: --out_depth must be .mkv/.avi/.nut.
 """
 import argparse
+import bisect
 import csv
 import os
+import shutil
 import subprocess
 import sys
+import threading
+import time
+import numpy as np
 import yaml
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Tuple
 
+# libyaml-backed C loader is ~10x faster than the pure-Python SafeLoader; fall back when PyYAML lacks libyaml
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# RGB and depth jobs run on worker threads; serialize their console output
+_log_lock = threading.Lock()
+
+def log(*args):
+    with _log_lock:
+        print(*args)
+
 def read_metadata_start_ns(metadata_path: str) -> Tuple[int, int]:
     with open(metadata_path, 'r') as f:
-        meta = yaml.safe_load(f)
+        meta = yaml.load(f, Loader=YamlLoader)
     rbi = meta.get('rosbag2_bagfile_information', {})
     # Try common locations
     start_ns = None
@@ -64,39 +82,42 @@ def read_metadata_start_ns(metadata_path: str) -> Tuple[int, int]:
         raise RuntimeError(f"cannot find starting_time in {metadata_path}")
     return int(start_ns), int(duration_ns) if duration_ns is not None else None
 
-def read_csv_timestamps(csv_path: str) -> List[Tuple[int,int]]:
-    # returns list of (frame_index, system_ts_ns)
-    rows = []
+def read_csv_timestamps(csv_path: str) -> np.ndarray:
+    # returns int64 array of shape (N, 2): (frame_index, system_ts_ns), sorted by frame_index
     with open(csv_path, newline='') as f:
-        dr = csv.DictReader(f)
-        for r in dr:
-            fi = int(r['Frame_Index'])
-            sys_ns = int(r['System_Timestamp_ns'])
-            rows.append((fi, sys_ns))
-    rows.sort(key=lambda x: x[0])
-    return rows
-
-def compute_rel_seconds(rows: List[Tuple[int,int]], start_ns: int):
-    # returns list of dicts with frame_index, sys_ns, rel_s
-    out = []
-    for fi, sys_ns in rows:
-        rel = (sys_ns - start_ns) / 1e9
-        out.append({'frame_index': fi, 'sys_ns': sys_ns, 'rel_s': rel})
-    return out
+        header = next(csv.reader(f))
+        cols = (header.index('Frame_Index'), header.index('System_Timestamp_ns'))
+        rows = np.loadtxt(f, delimiter=',', usecols=cols, dtype=np.int64, ndmin=2).reshape(-1, 2)
+    return rows[np.argsort(rows[:, 0], kind='stable')]
+
+def compute_rel_seconds(rows: np.ndarray, start_ns: int) -> np.ndarray:
+    # returns float64 array of seconds relative to start_ns, aligned with rows
+    return (rows[:, 1] - start_ns) / 1e9
 
 def detect_depth_naming(depth_dir: Path):
-    files = sorted([p.name for p in depth_dir.iterdir() if p.is_file()])
-    if not files:
+    # One scandir pass keeping the file with the smallest numeric stem; no full listing or sort.
+    # This picks by numeric value, not by the lexicographically first name as the old sorted listing did;
+    # the two agree when all frames share one zero-padded width. A stem of 0 cannot be beaten, so the
+    # scan stops there (0-based sequences); 1-based sequences still visit every entry.
+    best = None
+    found_file = False
+    with os.scandir(depth_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            found_file = True
+            stem = entry.name.rsplit('.', 1)[0]
+            if stem.isdigit():
+                val = int(stem)
+                if best is None or val < best[1]:
+                    best = (len(stem), val)
+                    if val == 0:
+                        break
+    if not found_file:
         raise RuntimeError(f"no files found in {depth_dir}")
-    # find first numeric filename part
-    for name in files:
-        stem = Path(name).stem
-        if stem.isdigit():
-            pad = len(stem)
-            first_val = int(stem)
-            return pad, first_val
-    # fallback: try parse filename like 000001.png by stripping ext
-    raise RuntimeError("no numeric depth filenames detected")
+    if best is None:
+        raise RuntimeError("no numeric depth filenames detected")
+    return best
 
 def is_video_file(path: Path) -> bool:
     """Check if the path is a video file (by extension)."""
@@ -104,16 +125,15 @@ def is_video_file(path: Path) -> bool:
     return path.suffix.lower() in video_extensions
 
 
-def find_start_end_indices(rel_list, start_offset=0.0, end_offset=None, duration_s=None):
-    # rel_list: list of dicts with rel_s; may not overlap with [0,duration]
+def find_start_end_indices(frames: np.ndarray, rel_s: np.ndarray, start_offset=0.0, end_offset=None, duration_s=None):
+    # frames / rel_s: parallel arrays of frame indices and relative seconds; may not overlap with [0,duration]
     # We'll pick the nearest frames to start_offset and to end_time_limit (fallback)
-    if not rel_list:
+    if len(rel_s) == 0:
         raise RuntimeError("empty rel_list")
     # sort by rel_s to be safe
-    rel_sorted = sorted(rel_list, key=lambda e: e['rel_s'])
-    times = [e['rel_s'] for e in rel_sorted]
-    frames = [e['frame_index'] for e in rel_sorted]
-    import bisect
+    order = np.argsort(rel_s, kind='stable')
+    times = rel_s[order]
+    frames = frames[order]
 
     # determine time limit for end
     if end_offset is not None:
@@ -124,81 +144,271 @@ def find_start_end_indices(rel_list, start_offset=0.0, end_offset=None, duration
         end_time_limit = float('inf')
 
     # find start: first frame with rel_s >= start_offset, else nearest (last frame before or closest)
-    pos = bisect.bisect_left(times, start_offset)
+    pos = int(np.searchsorted(times, start_offset, side='left'))
     if pos < len(times):
-        start_idx = frames[pos]
+        start_idx = int(frames[pos])
     else:
         # all frames are before start_offset -> pick last frame
-        start_idx = frames[-1]
+        start_idx = int(frames[-1])
 
     # find end: last frame with rel_s <= end_time_limit, else nearest (first after or closest)
-    pos_end = bisect.bisect_right(times, end_time_limit) - 1
+    pos_end = int(np.searchsorted(times, end_time_limit, side='right')) - 1
     if pos_end >= 0:
-        end_idx = frames[pos_end]
+        end_idx = int(frames[pos_end])
     else:
         # all frames are after end_time_limit -> pick first frame
-        end_idx = frames[0]
+        end_idx = int(frames[0])
 
     # if the selected end is before start, try to pick nearest frames by absolute difference
     if end_idx < start_idx:
-        # compute nearest indices to start_offset and end_time_limit by absolute diff
-        start_diff_idx = min(range(len(times)), key=lambda i: abs(times[i] - start_offset))
-        end_diff_idx = min(range(len(times)), key=lambda i: abs(times[i] - end_time_limit))
-        start_idx = frames[start_diff_idx]
-        end_idx = frames[end_diff_idx]
+        start_idx = int(frames[np.argmin(np.abs(times - start_offset))])
+        end_idx = int(frames[np.argmin(np.abs(times - end_time_limit))])
 
     if end_idx < start_idx:
         raise RuntimeError("end frame is before start frame after alignment (even after fallback)")
     return start_idx, end_idx
 
-def ffmpeg_crop(input_mp4: str, start_time: float, duration: float, out_mp4: str, dry_run=False):
-    # Use -ss START -i INPUT -t DURATION -c copy OUT for faster copy (may be keyframe related)
+# Coarse-seek preroll (s) used when keyframes cannot be probed: input-seek to start-Δ,
+# then output-seek the remaining Δ; Δ only needs to cover the preceding GOP
+SEEK_PREROLL_S = 0.2
+
+@lru_cache(maxsize=None)
+def probe_keyframe_times(video_path: str) -> Tuple[float, ...]:
+    """Return sorted keyframe timestamps (s) of the first video stream, read from packet flags without decoding."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    times = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' in flags and pts not in ('', 'N/A'):
+            times.append(float(pts))
+    return tuple(sorted(times))
+
+@lru_cache(maxsize=None)
+def probe_video_fps(video_path: str) -> float:
+    """Return the frame rate (r_frame_rate) of the first video stream."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=r_frame_rate',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    num, _, den = out.partition('/')
+    return float(num) / float(den or 1)
+
+@lru_cache(maxsize=None)
+def probe_video_codec(video_path: str) -> Tuple[str, str]:
+    """Return (codec_name, pix_fmt) of the first video stream."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,pix_fmt',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    codec, _, pix_fmt = out.partition(',')
+    return codec, pix_fmt
+
+# Containers that can carry FFV1 (record.py --lossless-depth writes 16-bit depth as FFV1 gray16le in .mkv)
+FFV1_CONTAINERS = ('.mkv', '.avi', '.nut')
+
+def is_lossless_depth(video_path: str) -> bool:
+    # 16-bit FFV1 depth from record.py --lossless-depth; False when probing fails
+    try:
+        codec, pix_fmt = probe_video_codec(video_path)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return codec == 'ffv1' or pix_fmt.startswith('gray16')
+
+def find_seek_point(video_path: str, start_time: float) -> float:
+    # last keyframe at or before start_time; fall back to a fixed preroll if probing fails
+    try:
+        keyframes = probe_keyframe_times(video_path)
+    except (OSError, subprocess.CalledProcessError):
+        keyframes = ()
+    pos = bisect.bisect_right(keyframes, start_time) - 1
+    if pos >= 0:
+        return keyframes[pos]
+    return max(0.0, start_time - SEEK_PREROLL_S)
+
+# A hung ffmpeg is killed once its reported output time has not advanced for this long;
+# slow re-encodes or copies over network storage keep running as long as they make progress
+FFMPEG_STALL_TIMEOUT_S = 60.0
+
+def run_ffmpeg(cmd: List[str], duration: float = None):
+    # Only errors reach ffmpeg's stderr, and stderr is kept in a pipe and surfaced only on failure.
+    # -nostdin keeps concurrent ffmpeg processes from reading the terminal.
+    # -progress pipe:1 streams key=value progress on stdout, parsed for a coarse percentage and a hang timeout.
+    full_cmd = cmd[:1] + ['-hide_banner', '-nostdin', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1'] + cmd[1:]
+    name = os.path.basename(cmd[-1])
+    proc = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # drain stderr concurrently so a chatty failure cannot block on a full pipe
+    stderr_chunks = []
+    stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    stderr_reader.start()
+
+    # watchdog: the deadline is pushed back whenever out_time advances
+    last_progress = [time.monotonic()]
+    finished = threading.Event()
+    timed_out = threading.Event()
+    def kill_stalled():
+        while not finished.wait(1.0):
+            if time.monotonic() - last_progress[0] > FFMPEG_STALL_TIMEOUT_S:
+                timed_out.set()
+                proc.kill()
+                return
+    watchdog = threading.Thread(target=kill_stalled, daemon=True)
+    watchdog.start()
+
+    last_pct = 0
+    last_out_us = -1
+    for line in proc.stdout:
+        key, _, value = line.partition(b'=')
+        if key in (b'out_time_us', b'out_time_ms'):  # both are microseconds
+            try:
+                out_us = int(value)
+            except ValueError:  # 'N/A' before the first packet
+                continue
+            if out_us > last_out_us:
+                last_out_us = out_us
+                last_progress[0] = time.monotonic()
+            if not duration:
+                continue
+            pct = min(100, int(out_us / 1e6 / duration * 100))
+            if pct >= last_pct + 25:
+                log(f"  {name}: {pct}%")
+                last_pct = pct
+    proc.wait()
+    finished.set()
+    watchdog.join()
+    stderr_reader.join()
+    stderr = b''.join(stderr_chunks)
+
+    if timed_out.is_set():
+        log(f"ffmpeg killed after {FFMPEG_STALL_TIMEOUT_S:.0f}s without progress: {name}")
+        raise subprocess.TimeoutExpired(full_cmd, FFMPEG_STALL_TIMEOUT_S, stderr=stderr)
+    if proc.returncode != 0:
+        log(f"ffmpeg failed (exit {proc.returncode}): {stderr.decode('utf-8', errors='replace').strip()}")
+        raise subprocess.CalledProcessError(proc.returncode, full_cmd, stderr=stderr)
+
+def ffmpeg_crop(input_mp4: str, start_time: float, duration: float, out_mp4: str, dry_run=False, exact=False):
+    # -ss before -i: input-side seek jumps straight to the nearest keyframe instead of decoding from t=0.
+    # Stream copy can only cut on keyframes; -avoid_negative_ts make_zero rebases output timestamps to 0.
+    # exact=True: two-stage seek (input seek to the preceding keyframe, output seek for the residual);
+    # stays stream copy when start_time is on a keyframe, otherwise re-encodes.
+    seek = start_time
+    residual = 0.0
+    if exact:
+        seek = find_seek_point(input_mp4, start_time)
+        residual = start_time - seek
+    cmd = ['ffmpeg', '-y', '-ss', f'{seek:.6f}', '-i', input_mp4]
+    if residual > 1e-3:
+        cmd += [
+            '-ss', f'{residual:.6f}',
+            '-t', f'{duration:.6f}',
+            '-c:v', 'libx264', '-preset', 'superfast',
+            '-an',
+            out_mp4
+        ]
+    else:
+        cmd += [
+            '-t', f'{duration:.6f}',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            out_mp4
+        ]
+    log("ffmpeg command:", ' '.join(cmd))
+    if dry_run:
+        return
+    run_ffmpeg(cmd, duration)
+
+def ffmpeg_crop_pair(rgb_mp4: str, depth_mp4: str, start_time: float, duration: float, out_rgb: str, out_depth: str, dry_run=False):
+    # Stream-copy RGB and depth videos over the same window in one ffmpeg process (one fork/probe instead of two).
+    # Each input keeps its own input-side -ss; output options are repeated per output.
     cmd = [
         'ffmpeg', '-y',
-        '-ss', f'{start_time:.6f}',
-        '-i', input_mp4,
-        '-t', f'{duration:.6f}',
-        '-c', 'copy',
-        out_mp4
+        '-ss', f'{start_time:.6f}', '-i', rgb_mp4,
+        '-ss', f'{start_time:.6f}', '-i', depth_mp4,
+        '-map', '0:v:0', '-t', f'{duration:.6f}', '-c', 'copy', '-avoid_negative_ts', 'make_zero', out_rgb,
+        '-map', '1:v:0', '-t', f'{duration:.6f}', '-c', 'copy', '-avoid_negative_ts', 'make_zero', out_depth
     ]
-    print("ffmpeg command:", ' '.join(cmd))
+    log("rgb+depth ffmpeg command:", ' '.join(cmd))
     if dry_run:
         return
-    subprocess.check_call(cmd)
+    run_ffmpeg(cmd, duration)
 
 def ffmpeg_depth_crop(input_video: str, start_time: float, duration: float, out_video: str, dry_run=False):
-    # Crop depth video (16-bit grayscale) using re-encoding for precise frame handling
-    # -pix_fmt gray16le ensures 16-bit grayscale output for depth data
+    # Frame-accurate depth crop (opt-in via --depth_reencode) using combined seeking:
+    # fast input seek to the preceding keyframe, then a precise output seek, then lossless re-encode.
+    # 16-bit depth is re-encoded as FFV1 with its own pixel format: libx264 has no gray16 input and
+    # would silently reduce the millimetre values to a lower bit depth.
+    coarse = find_seek_point(input_video, start_time)
+    fine = start_time - coarse
+    if is_lossless_depth(input_video):
+        codec_args = ['-c:v', 'ffv1', '-level', '3', '-pix_fmt', probe_video_codec(input_video)[1]]
+    else:
+        codec_args = ['-c:v', 'libx264', '-preset', 'superfast', '-qp', '0']
     cmd = [
         'ffmpeg', '-y',
-        '-ss', f'{start_time:.6f}',
+        '-ss', f'{coarse:.6f}',
         '-i', input_video,
+        '-ss', f'{fine:.6f}',
         '-t', f'{duration:.6f}',
-        '-c', 'copy',
+        *codec_args,
+        '-an',
         out_video
     ]
-    print("depth ffmpeg command:", ' '.join(cmd))
+    log("depth ffmpeg command:", ' '.join(cmd))
     if dry_run:
         return
-    subprocess.check_call(cmd)
-
-def copy_depth_frames(depth_dir: Path, out_dir: Path, start_frame: int, end_frame: int, pad: int, first_val: int, dry_run=False):
+    run_ffmpeg(cmd, duration)
+
+def link_or_copy(src: Path, dst: Path):
+    # hardlink on the same filesystem (O(1), no bytes moved); full copy across filesystems
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        os.unlink(dst)
+        link_or_copy(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def copy_depth_frames(depth_dir: Path, out_dir: Path, start_frame: int, end_frame: int, pad: int, first_val: int, dry_run=False, verbose=False, workers=8):
     out_dir.mkdir(parents=True, exist_ok=True)
     # Determine whether file index base is 0 or 1 by comparing first_val
     base_offset = 0 if first_val == 0 else 1
+    # one readdir up front instead of a stat() per frame
+    with os.scandir(depth_dir) as it:
+        available = {e.name for e in it if e.name.endswith('.png') and e.is_file()}
+    fname_fmt = "%%0%dd.png" % pad
+    jobs = []
     for frame in range(start_frame, end_frame + 1):
-        file_index = frame + base_offset
-        fname = f"{file_index:0{pad}d}.png"
+        fname = fname_fmt % (frame + base_offset)
         src = depth_dir / fname
-        if not src.exists():
+        if fname not in available:
             # warn and continue
-            print(f"warning: depth file missing: {src}")
+            log(f"warning: depth file missing: {src}")
             continue
         dst = out_dir / fname
-        print(f"copy {src} -> {dst}")
-        if not dry_run:
-            import shutil
-            shutil.copy2(src, dst)
+        if verbose:
+            log(f"copy {src} -> {dst}")
+        jobs.append((src, dst))
+    log(f"depth frames: {len(jobs)} to link/copy -> {out_dir}")
+    if dry_run or not jobs:
+        return
+    # per-file copies are I/O bound; overlap them on a small thread pool
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda job: link_or_copy(*job), jobs))
 
 def parse_args():
     p = argparse.ArgumentParser(description="Align external camera CSV timestamps to metadata start and crop RGB+depth.")
@@ -208,11 +418,14 @@ def parse_args():
     p.add_argument('--depth', required=True, help='depth input: either a directory with depth images (numeric names like 000001.png) or a depth video file (.mp4)')
     p.add_argument('--out_video', required=True, help='output cropped RGB mp4 path')
     p.add_argument('--out_depth', required=True, help='output: either directory for cropped depth frames OR output video path (if --depth_is_video)')
-    p.add_argument('--ext_fps', type=float, default=30.0, help='external camera FPS (default 30)')
+    p.add_argument('--ext_fps', type=float, default=None, help='external camera FPS (default: probed from --rgb, else 30); the probed container rate wins on mismatch')
     p.add_argument('--start_offset', type=float, default=0.0, help='seconds after episode start to begin crop (default 0)')
     p.add_argument('--end_offset', type=float, default=None, help='seconds after episode start to end crop (default: metadata duration)')
     p.add_argument('--depth_is_video', action='store_true', help='treat --depth as a video file instead of image directory')
+    p.add_argument('--depth_reencode', action='store_true', help='with --depth_is_video: re-encode the depth crop for a frame-accurate cut instead of keyframe stream copy')
+    p.add_argument('--exact_cut', action='store_true', help='frame-accurate cuts: seek to the preceding keyframe, re-encode only when start is not on a keyframe (implies --depth_reencode)')
     p.add_argument('--dry_run', action='store_true', help='do not run ffmpeg or copy files, just print actions')
+    p.add_argument('--verbose', action='store_true', help='print every depth frame copy')
     return p.parse_args()
 
 def main():
@@ -232,44 +445,85 @@ def main():
     rel = compute_rel_seconds(rows, start_ns)
 
     # debug show sample
-    print(f"CSV rows read: {len(rel)}. sample: {rel[0] if rel else 'empty'}")
+    sample = {'frame_index': int(rows[0, 0]), 'sys_ns': int(rows[0, 1]), 'rel_s': float(rel[0])} if len(rows) else 'empty'
+    print(f"CSV rows read: {len(rows)}. sample: {sample}")
 
     # determine start/end frame indices
-    start_frame, end_frame = find_start_end_indices(rel, start_offset=args.start_offset, end_offset=args.end_offset, duration_s=duration_s)
+    start_frame, end_frame = find_start_end_indices(rows[:, 0], rel, start_offset=args.start_offset, end_offset=args.end_offset, duration_s=duration_s)
     print(f"determined frames: start_frame={start_frame}, end_frame={end_frame}")
 
+    # The recorder writes every captured frame into a constant-rate container, so frame k sits at k / fps
+    # in the video; take fps from the container instead of trusting --ext_fps
+    try:
+        probed_fps = probe_video_fps(str(rgbp))
+    except (OSError, ValueError, ZeroDivisionError, subprocess.CalledProcessError):
+        probed_fps = None
+    ext_fps = args.ext_fps
+    if probed_fps:
+        if ext_fps is not None and abs(probed_fps - ext_fps) > 1e-3:
+            print(f"warning: --ext_fps {ext_fps} differs from container fps {probed_fps:.3f} of {rgbp}; using container fps")
+        ext_fps = probed_fps
+    elif ext_fps is None:
+        ext_fps = 30.0
+
     # compute ffmpeg times (relative to external video start)
-    start_time = start_frame / float(args.ext_fps)
-    duration = (end_frame - start_frame + 1) / float(args.ext_fps)
-    print(f"FFmpeg will crop from {start_time:.6f}s for duration {duration:.6f}s (ext_fps={args.ext_fps})")
+    start_time = start_frame / float(ext_fps)
+    duration = (end_frame - start_frame + 1) / float(ext_fps)
+    print(f"FFmpeg will crop from {start_time:.6f}s for duration {duration:.6f}s (ext_fps={ext_fps})")
 
     if args.dry_run:
         print("DRY RUN: no ffmpeg or file operations will be executed.")
 
-    # Process RGB video
-    ffmpeg_crop(str(rgbp), start_time, duration, str(out_video), dry_run=args.dry_run)
-
-    # Process depth: either as video or as image directory
     if args.depth_is_video:
         # Depth is a video file, crop it similarly
         if not is_video_file(depth_input):
             raise RuntimeError(f"depth_is_video is set but --depth is not a video file: {depth_input}")
-        depth_output = out_depth  # out_depth is the output video path
-        print(f"Cropping depth video: {depth_input} -> {depth_output}")
-        ffmpeg_crop(str(depth_input), start_time, duration, str(depth_output), dry_run=args.dry_run)
-        print("done. outputs:")
-        print("  video ->", out_video)
-        print("  depth video ->", depth_output)
+        # FFV1 depth (stream-copied or re-encoded) only fits containers that accept FFV1; MP4 does not
+        if is_lossless_depth(str(depth_input)) and out_depth.suffix.lower() not in FFV1_CONTAINERS:
+            raise RuntimeError(f"{depth_input} is 16-bit FFV1 depth; --out_depth must use one of {', '.join(FFV1_CONTAINERS)}, got {out_depth}")
+        print(f"Cropping depth video: {depth_input} -> {out_depth}")
+    elif not depth_input.is_dir():
+        raise RuntimeError(f"--depth is not a directory: {depth_input}")
+
+    # Both videos stream-copied over the same window: a single ffmpeg invocation with two outputs
+    cropped = False
+    if args.depth_is_video and not (args.depth_reencode or args.exact_cut):
+        try:
+            ffmpeg_crop_pair(str(rgbp), str(depth_input), start_time, duration, str(out_video), str(out_depth), dry_run=args.dry_run)
+            cropped = True
+        except subprocess.CalledProcessError as e:
+            print(f"warning: combined rgb+depth ffmpeg failed ({e}), falling back to separate crops")
+
+    if not cropped:
+        # RGB and depth outputs are independent: run the depth job alongside the RGB ffmpeg crop
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Process RGB video
+            rgb_job = executor.submit(ffmpeg_crop, str(rgbp), start_time, duration, str(out_video),
+                                      dry_run=args.dry_run, exact=args.exact_cut)
+
+            # Process depth: either as video or as image directory
+            if args.depth_is_video:
+                if args.depth_reencode or args.exact_cut:
+                    depth_job = executor.submit(ffmpeg_depth_crop, str(depth_input), start_time, duration, str(out_depth),
+                                                dry_run=args.dry_run)
+                else:
+                    depth_job = executor.submit(ffmpeg_crop, str(depth_input), start_time, duration, str(out_depth),
+                                                dry_run=args.dry_run)
+            else:
+                # depth frames copy: detect pad & base
+                pad, first_val = detect_depth_naming(depth_input)
+                print(f"detected depth naming pad={pad}, first_val={first_val}")
+                depth_job = executor.submit(copy_depth_frames, depth_input, out_depth, start_frame, end_frame, pad, first_val,
+                                            dry_run=args.dry_run, verbose=args.verbose)
+
+            rgb_job.result()
+            depth_job.result()
+
+    print("done. outputs:")
+    print("  video ->", out_video)
+    if args.depth_is_video:
+        print("  depth video ->", out_depth)
     else:
-        # Depth is a directory of images
-        if not depth_input.is_dir():
-            raise RuntimeError(f"--depth is not a directory: {depth_input}")
-        # depth frames copy: detect pad & base
-        pad, first_val = detect_depth_naming(depth_input)
-        print(f"detected depth naming pad={pad}, first_val={first_val}")
-        copy_depth_frames(depth_input, out_depth, start_frame, end_frame, pad, first_val, dry_run=args.dry_run)
-        print("done. outputs:")
-        print("  video ->", out_video)
         print("  depth dir ->", out_depth)
 
 if __name__ == '__main__':
@@ -3,67 +3,171 @@
 自动生成 raw_data_meta.json 文件
 遍历目录结构,为每个包含mcap文件的子目录创建对应的元数据文件
 用法：
-    python generate_raw_data_meta.py [root_directory]
+    python generate_raw_data_meta.py [root_directory] [--force]
 如果未指定 root_directory，则使用脚本所在目录。 
+已存在且比所有输入文件都新的 raw_data_meta.json 会被跳过，--force 强制重新生成。
 """
+import argparse
 import os
 import json
 import yaml
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# libyaml 提供的 C 解析器比纯 Python 的 SafeLoader 快约 10 倍，PyYAML 未编译 libyaml 时退回 SafeLoader
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+OUTPUT_FILE_NAME = 'raw_data_meta.json'
+# create_raw_data_meta 的返回值: 输出文件已是最新，无需重新生成
+UP_TO_DATE = 'up_to_date'
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _read_yaml(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+# 路径中的日期目录(YYYYMMDD)，group(1) 为其后的剩余路径
+_DATE_DIR_RE = re.compile(r'(?:^|/)\d{8}(?:/(.*))?$')
+
+def dig(data, *keys, default=None):
+    """沿嵌套 dict 逐层取值，任一层缺失或不是 dict 时返回 default"""
+    for key in keys:
+        if not isinstance(data, dict):
+            return default
+        data = data.get(key)
+        if data is None:
+            return default
+    return data
+
+def find_mcap_file(raw_folder_path):
+    """返回 _RAW 文件夹中第一个 mcap 文件名，没有则返回 None"""
+    try:
+        with os.scandir(raw_folder_path) as it:
+            for entry in it:
+                if entry.name.endswith('.mcap'):
+                    return entry.name
+    except OSError as e:
+        print(f"Warning: Failed to scan {raw_folder_path}: {e}")
+    return None
+
 def find_mcap_folders(root_dir):
     """
     查找所有包含 mcap 文件的文件夹
-    返回: {folder_path: [mcap_folders_list]}
+    扫描时顺带记下每个 _RAW 文件夹中的 mcap 文件名，后续无需再次 listdir
+    返回: {folder_path: [(raw_folder_name, mcap_file_name_or_None), ...]}
     """
     result = {}
-    
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        # 跳过 fail 文件夹
-        if 'fail' in dirpath.split(os.sep):
+    # 手动 DFS: 只枚举目录，剪掉 fail 子树，并且不进入 _RAW 文件夹
+    # (_RAW 内只有 mcap 等数据文件)，避免像 os.walk 那样遍历海量数据文件
+    stack = [root_dir]
+    while stack:
+        dirpath = stack.pop()
+        raw_folders = []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if not entry.is_dir():
+                        continue
+                    # 跳过 fail 文件夹
+                    if entry.name == 'fail':
+                        continue
+                    # 查找当前目录下的所有以 _RAW 结尾的文件夹
+                    if entry.name.endswith('_RAW'):
+                        raw_folders.append((entry.name, find_mcap_file(entry.path)))
+                    elif not entry.is_symlink():
+                        stack.append(entry.path)
+        except OSError as e:
+            print(f"Warning: Failed to scan {dirpath}: {e}")
             continue
-        
-        # 查找当前目录下的所有以 _RAW 结尾的文件夹
-        raw_folders = [d for d in dirnames if d.endswith('_RAW')]
-        
+
         if raw_folders:
             result[dirpath] = raw_folders
-    
+
     return result
 
-def create_raw_data_meta(folder_path, raw_folders):
+def dataset_labels(folder_path):
     """
-    为指定文件夹创建 raw_data_meta.json
+    从路径中提取数据集名称和 annotations.text
+    例如: path = "/Users/psy/workspace/data/r1lite/20260203/pick_3_bottles_and_place_it_into_trashbin/left_arm/order_low_mid_tall"
+    dataset_name = "pick_3_bottles_and_place_it_into_trashbin"
+    annotations.text = "pick 3 bottles and place it into trashbin left arm order low mid tall"
     """
-    # 从路径中提取数据集名称
-    # 例如: path = "/Users/psy/workspace/data/r1lite/20260203/pick_3_bottles_and_place_it_into_trashbin/left_arm/order_low_mid_tall"
-    # dataset_name = "pick_3_bottles_and_place_it_into_trashbin"
-    # annotations.text = "pick 3 bottles and place it into trashbin left arm order low mid tall"
-    path_parts = Path(folder_path).parts
-
-    # 查找日期目录(YYYYMMDD)，提取日期后的一级目录名作为数据集名称
+    # 查找第一个日期目录(YYYYMMDD)，提取日期后的一级目录名作为数据集名称
+    # 未找到日期目录时，退化为使用当前目录名
     dataset_name = os.path.basename(folder_path)
-    annotation_text = ''
-    try:
-        date_index = next(
-            i for i, part in enumerate(path_parts)
-            if re.match(r'^\d{8}$', part)
-        )
-        if date_index + 1 < len(path_parts):
-            dataset_name = path_parts[date_index + 1]
-
+    m = _DATE_DIR_RE.search(Path(folder_path).as_posix())
+    if m:
         # 使用日期后的路径生成 annotations.text
-        text_parts = path_parts[date_index + 1:]
-        annotation_text = ' '.join(p.replace('_', ' ') for p in text_parts if p)
-    except StopIteration:
-        # 未找到日期目录时，退化为使用当前目录名
-        dataset_name = os.path.basename(folder_path)
+        text_parts = [p for p in (m.group(1) or '').split('/') if p]
+        if text_parts:
+            dataset_name = text_parts[0]
+        annotation_text = ' '.join(p.replace('_', ' ') for p in text_parts)
+    else:
         annotation_text = dataset_name.replace('_', ' ')
+    return dataset_name, annotation_text
+
+def is_up_to_date(folder_path, raw_folders):
+    """
+    raw_data_meta.json 比所有输入都新、且其中由路径得到的字段与当前位置一致时返回 True
+    输入包括文件夹本身、各 _RAW 文件夹及其 json / metadata.yaml；
+    增删 _RAW 文件夹或 mcap 文件会更新所在目录的 mtime，因此也能被检测到。
+    数据集被保留 mtime 拷贝 (cp -a / rsync -a) 或从其他根目录扫描时，path 等字段会变化，需要重新生成
+    """
+    output_file = os.path.join(folder_path, OUTPUT_FILE_NAME)
+    try:
+        output_mtime = os.stat(output_file).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+    sources = [folder_path]
+    for raw_folder, _ in raw_folders:
+        raw_folder_path = os.path.join(folder_path, raw_folder)
+        sources += [raw_folder_path, raw_folder_path + '.json', os.path.join(raw_folder_path, 'metadata.yaml')]
+    for path in sources:
+        try:
+            if os.stat(path).st_mtime_ns > output_mtime:
+                return False
+        except FileNotFoundError:
+            continue
+
+    # 检查已有输出中由路径得到的字段
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        dataset_name, annotation_text = dataset_labels(folder_path)
+        if existing.get('rawDataSetName') != dataset_name:
+            return False
+        expected_paths = [os.path.join(folder_path, raw_folder, mcap_file)
+                          for raw_folder, mcap_file in sorted(raw_folders) if mcap_file]
+        items = existing.get('rawDataList') or []
+        if [item.get('path') for item in items] != expected_paths:
+            return False
+        # annotation_text 为空时 text 取自 JSON 中的任务名，无需比较
+        if annotation_text and any(a.get('text') != annotation_text
+                                   for item in items for a in item.get('annotations', [])):
+            return False
+    except (OSError, ValueError, AttributeError, TypeError):
+        return False
+    return True
+
+def create_raw_data_meta(folder_path, raw_folders, force=False):
+    """
+    为指定文件夹创建 raw_data_meta.json
+    输出文件已是最新且未指定 force 时返回 UP_TO_DATE
+    """
+    if not force and is_up_to_date(folder_path, raw_folders):
+        return UP_TO_DATE
+
+    # 从路径中提取数据集名称和 annotations.text
+    dataset_name, annotation_text = dataset_labels(folder_path)
     
     raw_data_list = []
     
-    for raw_folder in sorted(raw_folders):
+    for raw_folder, mcap_file in sorted(raw_folders):
         raw_folder_path = os.path.join(folder_path, raw_folder)
         json_file = os.path.join(folder_path, raw_folder + '.json')
         metadata_yaml_file = os.path.join(raw_folder_path, 'metadata.yaml')
@@ -72,8 +176,7 @@ def create_raw_data_meta(folder_path, raw_folders):
         metadata = {}
         if os.path.exists(json_file):
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
+                metadata = _read_json(json_file)
             except Exception as e:
                 print(f"Warning: Failed to read {json_file}: {e}")
         
@@ -81,18 +184,15 @@ def create_raw_data_meta(folder_path, raw_folders):
         yaml_metadata = {}
         if os.path.exists(metadata_yaml_file):
             try:
-                with open(metadata_yaml_file, 'r', encoding='utf-8') as f:
-                    yaml_metadata = yaml.safe_load(f)
+                yaml_metadata = _read_yaml(metadata_yaml_file)
             except Exception as e:
                 print(f"Warning: Failed to read {metadata_yaml_file}: {e}")
         
-        # 查找 mcap 文件
-        mcap_files = [f for f in os.listdir(raw_folder_path) if f.endswith('.mcap')]
-        if not mcap_files:
+        # mcap 文件名已在 find_mcap_folders 扫描时得到
+        if not mcap_file:
             print(f"Warning: No mcap file found in {raw_folder_path}")
             continue
         
-        mcap_file = mcap_files[0]
         mcap_path = os.path.join(raw_folder_path, mcap_file)
         
         # 提取机器人类型
@@ -108,9 +208,9 @@ def create_raw_data_meta(folder_path, raw_folders):
         # 从 metadata.yaml 和 JSON 构建 annotations
         if yaml_metadata and metadata:
             try:
-                bag_info = yaml_metadata.get('rosbag2_bagfile_information', {})
-                starting_time_ns = bag_info.get('starting_time', {}).get('nanoseconds_since_epoch', 0)
-                duration_ns = bag_info.get('duration', {}).get('nanoseconds', 0)
+                bag_info = yaml_metadata.get('rosbag2_bagfile_information')
+                starting_time_ns = dig(bag_info, 'starting_time', 'nanoseconds_since_epoch', default=0)
+                duration_ns = dig(bag_info, 'duration', 'nanoseconds', default=0)
                 
                 # 转换为秒
                 start_second = int(starting_time_ns // 1_000_000_000)
@@ -120,8 +220,8 @@ def create_raw_data_meta(folder_path, raw_folders):
                 end_nanosecond = int(end_timestamp_ns % 1_000_000_000)
                 
                 # 从 JSON 获取任务描述和质量标签
-                task_name = metadata.get('task_info', {}).get('task_name', '')
-                fail_label = metadata.get('label', {}).get('fail', '')
+                task_name = dig(metadata, 'task_info', 'task_name', default='')
+                fail_label = dig(metadata, 'label', 'fail', default='')
                 
                 # 构建 annotation
                 annotation = {
@@ -151,14 +251,37 @@ def create_raw_data_meta(folder_path, raw_folders):
     
     return raw_data_meta
 
+def report_folder(folder_path, raw_folders, raw_data_meta):
+    """保存单个文件夹的 raw_data_meta.json 并打印处理结果"""
+    print(f"处理: {folder_path}")
+    print(f"  找到 {len(raw_folders)} 个数据文件夹")
+
+    if raw_data_meta == UP_TO_DATE:
+        print(f"  - 跳过 (已是最新)")
+    elif raw_data_meta:
+        # 保存到文件
+        output_file = os.path.join(folder_path, OUTPUT_FILE_NAME)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(raw_data_meta, f, indent=2, ensure_ascii=False)
+
+        print(f"  ✓ 创建: {output_file}")
+        print(f"    数据集名称: {raw_data_meta['rawDataSetName']}")
+        print(f"    数据数量: {len(raw_data_meta['rawDataList'])}")
+    else:
+        print(f"  ✗ 跳过 (无有效数据)")
+
+    print()
+
 def main():
+    parser = argparse.ArgumentParser(description="自动生成 raw_data_meta.json 文件")
+    parser.add_argument("root_dir", nargs='?', default=None,
+                        help="数据根目录，默认使用脚本所在目录")
+    parser.add_argument("--force", action='store_true',
+                        help="忽略已是最新的输出，强制重新生成")
+    args = parser.parse_args()
+
     # 如果没有指定路径,则使用当前脚本所在目录,否则使用指定路径
-    import sys
-    root_dir = ''
-    if len(sys.argv) == 2:
-        root_dir = sys.argv[1]
-    else:
-        root_dir = os.path.dirname(os.path.abspath(__file__))
+    root_dir = args.root_dir or os.path.dirname(os.path.abspath(__file__))
     print(f"扫描目录: {root_dir}")
     
     # 查找所有包含 mcap 的文件夹
@@ -167,29 +290,19 @@ def main():
     print(f"\n找到 {len(mcap_folders_dict)} 个包含数据的文件夹:\n")
     
     created_count = 0
-    for folder_path, raw_folders in sorted(mcap_folders_dict.items()):
-        print(f"处理: {folder_path}")
-        print(f"  找到 {len(raw_folders)} 个数据文件夹")
-        
-        # 创建元数据
-        raw_data_meta = create_raw_data_meta(folder_path, raw_folders)
-        
-        if raw_data_meta:
-            # 保存到文件
-            output_file = os.path.join(folder_path, 'raw_data_meta.json')
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(raw_data_meta, f, indent=2, ensure_ascii=False)
-            
-            print(f"  ✓ 创建: {output_file}")
-            print(f"    数据集名称: {raw_data_meta['rawDataSetName']}")
-            print(f"    数据数量: {len(raw_data_meta['rawDataList'])}")
-            created_count += 1
-        else:
-            print(f"  ✗ 跳过 (无有效数据)")
-        
-        print()
-    
-    print(f"\n总计创建了 {created_count} 个 raw_data_meta.json 文件")
+    skipped_count = 0
+    folders = sorted(mcap_folders_dict.items())
+    # 各文件夹相互独立且以小文件读取为主，用线程池并发生成，结果按顺序输出
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        metas = executor.map(lambda item: create_raw_data_meta(*item, force=args.force), folders)
+        for (folder_path, raw_folders), raw_data_meta in zip(folders, metas):
+            report_folder(folder_path, raw_folders, raw_data_meta)
+            if raw_data_meta == UP_TO_DATE:
+                skipped_count += 1
+            elif raw_data_meta is not None:
+                created_count += 1
+
+    print(f"\n总计创建了 {created_count} 个 raw_data_meta.json 文件，{skipped_count} 个已是最新")
 
 if __name__ == '__main__':
     main()
@@ -51,6 +51,12 @@ TF_RIGHT_GRIPPER_TO_CAM = {
 # 2. 辅助函数 (Helper Functions)
 # ==========================================
 
+# 输出统一使用标准库 json (4 空格缩进)，不随是否安装 orjson 改变文件格式
+JSON_INDENT = b'    '
+
+def dump_json(obj):
+    return json.dumps(obj, indent=4).encode('utf-8')
+
 def get_matrix(pos, quat):
     """将位置和四元数(xyzw)转换为4x4齐次变换矩阵"""
     mat = np.eye(4)
@@ -59,6 +65,13 @@ def get_matrix(pos, quat):
     mat[:3, :3] = r.as_matrix()
     return mat
 
+def get_matrices(poses):
+    """将 (N,7) 的位姿数组 [x,y,z, qx,qy,qz,qw] 批量转换为 (N,4,4) 齐次变换矩阵"""
+    mats = np.tile(np.eye(4), (len(poses), 1, 1))
+    mats[:, :3, 3] = poses[:, :3]
+    mats[:, :3, :3] = R.from_quat(poses[:, 3:]).as_matrix()
+    return mats
+
 def get_pos_quat(matrix):
     """从4x4矩阵提取位置和四元数(xyzw)"""
     pos = matrix[:3, 3].tolist()
@@ -66,6 +79,10 @@ def get_pos_quat(matrix):
     quat = r.as_quat().tolist() # xyzw
     return pos, quat
 
+def get_pos_quats(mats):
+    """从 (N,4,4) 矩阵批量提取位置 (N,3) 和四元数 (N,4, xyzw)"""
+    return mats[:, :3, 3], R.from_matrix(mats[:, :3, :3]).as_quat()
+
 # 预计算静态矩阵 (Pre-compute Static Matrices)
 MAT_BASE_TO_TORSO = get_matrix(TF_BASE_TO_TORSO['pos'], TF_BASE_TO_TORSO['quat'])
 MAT_TORSO_TO_HEAD_LEFT = get_matrix(TF_TORSO_TO_HEAD_LEFT['pos'], TF_TORSO_TO_HEAD_LEFT['quat'])
@@ -77,93 +94,150 @@ MAT_R_GRIP_TO_CAM = get_matrix(TF_RIGHT_GRIPPER_TO_CAM['pos'], TF_RIGHT_GRIPPER_
 # 3. 主处理逻辑 (Main Logic)
 # ==========================================
 
-def process_file(input_path, output_path, target_frame):
+# 输入中参与计算的位姿列 [x,y,z, qx,qy,qz,qw] (Torso Frame)
+POSE_COLUMNS = ['observation.state.left_ee_pose', 'observation.state.right_ee_pose']
+
+def build_columns(final_mats, static_mats, n, pose_only=False):
+    """
+    生成默认格式的输出列: [(key, 第一维长度为 N 的 numpy 数组或列表), ...]
+    {prefix}_pose 为平铺格式 [x,y,z, qx,qy,qz,qw] 方便绘图脚本直接使用，
+    同时保留拆分格式 {prefix}_pos / {prefix}_quat 以及 {prefix}_matrix
+    pose_only=True 时只输出 {prefix}_pose，其余均可由它推导
+    """
+    # 逐帧变化的输出整列保留为 numpy 数组 ((N,7) pose 等)，写出时才逐帧转换为 python 列表
+    columns = []
+    for prefix, mats in final_mats.items():
+        pos, quat = get_pos_quats(mats)
+        if pose_only:
+            columns.append((f'{prefix}_pose', np.hstack([pos, quat])))
+            continue
+        columns += [(f'{prefix}_pose', np.hstack([pos, quat])),
+                    (f'{prefix}_pos', pos),
+                    (f'{prefix}_quat', quat),
+                    (f'{prefix}_matrix', mats)]
+    # 静态输出每帧相同，各帧共享同一个 python 列表
+    for prefix, mat in static_mats.items():
+        p, q = get_pos_quat(mat)
+        if pose_only:
+            columns.append((f'{prefix}_pose', [p + q] * n))
+            continue
+        columns += [(f'{prefix}_pose', [p + q] * n),
+                    (f'{prefix}_pos', [p] * n),
+                    (f'{prefix}_quat', [q] * n),
+                    (f'{prefix}_matrix', [mat.tolist()] * n)]
+    return columns
+
+def iter_frames(columns, n, timestamps):
+    """按帧生成输出 (默认格式): 每帧一个 dict，逐帧 yield，任一时刻只有一帧的 python 对象"""
+    for i in range(n):
+        # numpy 列只转换当前帧这一行
+        frame_data = {key: col[i].tolist() if isinstance(col, np.ndarray) else col[i] for key, col in columns}
+
+        # 保留时间戳
+        if timestamps is not None:
+            frame_data['timestamp'] = timestamps[i]
+
+        yield frame_data
+
+def write_json_frames(output_path, frames):
+    """逐帧流式写出 JSON 数组，输出与一次性序列化整个列表逐字节相同"""
+    with open(output_path, 'wb') as f:
+        sep = b'[\n' + JSON_INDENT
+        for frame_data in frames:
+            f.write(sep)
+            # 帧内每行再缩进一级，与数组元素的缩进对齐
+            f.write(dump_json(frame_data).replace(b'\n', b'\n' + JSON_INDENT))
+            sep = b',\n' + JSON_INDENT
+        f.write(b'[]' if sep.startswith(b'[') else b'\n]')
+
+def write_parquet_frames(output_path, columns, timestamps):
+    """将默认格式的输出列写为 parquet (每帧一行，列名与 JSON 的 key 相同)，读写都远快于 JSON"""
+    data = {key: col.tolist() if isinstance(col, np.ndarray) else col for key, col in columns}
+    if timestamps is not None:
+        data['timestamp'] = timestamps
+    pd.DataFrame(data).to_parquet(output_path, compression='zstd', index=False)
+
+def process_file(input_path, output_path, target_frame, layout='frames', pose_only=False, output_format='json'):
     print(f"正在读取: {input_path}")
     
     # 读取输入文件
     if input_path.endswith('.json'):
         df = pd.read_json(input_path)
     else:
-        df = pd.read_parquet(input_path)
+        # parquet 为列式存储，只读取用到的列，图像/关节等其余列不会被解码
+        try:
+            df = pd.read_parquet(input_path, columns=POSE_COLUMNS + ['timestamp'])
+        except ValueError:  # 没有 timestamp 列
+            df = pd.read_parquet(input_path, columns=POSE_COLUMNS)
 
-    results = []
-    
     print(f"开始处理 {len(df)} 帧数据，目标坐标系: {target_frame}...")
 
     # 确定全局变换矩阵 (Transform Selector)
     # 如果目标是 base_link，我们需要将所有相对于 torso 的数据再左乘 T_base_to_torso
-    # 如果目标是 torso_link3，数据保持原样 (单位矩阵)
+    # 如果目标是 torso_link3，数据保持原样 (单位矩阵，直接跳过左乘)
     if target_frame == 'base_link':
         TRANSFORM_MAT = MAT_BASE_TO_TORSO
     else: # torso_link3
-        TRANSFORM_MAT = np.eye(4)
-
-    for index, row in df.iterrows():
-        frame_data = {}
-        
-        # --- 1. 读取原始数据 (均在 Torso Frame 下) ---
-        l_ee_pose_raw = row['observation.state.left_ee_pose']  # [x,y,z, qx,qy,qz,qw]
-        r_ee_pose_raw = row['observation.state.right_ee_pose']
-        
-        # 转为矩阵 (Relative to Torso)
-        mat_torso_to_l_grip = get_matrix(l_ee_pose_raw[:3], l_ee_pose_raw[3:])
-        mat_torso_to_r_grip = get_matrix(r_ee_pose_raw[:3], r_ee_pose_raw[3:])
-        
-        # --- 2. 计算中间过程 (Relative to Torso) ---
-        
-        # 计算腕部相机 (Torso -> Grip -> Cam)
-        mat_torso_to_l_wrist_cam = np.dot(mat_torso_to_l_grip, MAT_L_GRIP_TO_CAM)
-        mat_torso_to_r_wrist_cam = np.dot(mat_torso_to_r_grip, MAT_R_GRIP_TO_CAM)
-        
-        # 头部相机 (Torso -> Head Cam) - 已经是静态已知的
-        mat_torso_to_head_l = MAT_TORSO_TO_HEAD_LEFT
-        mat_torso_to_head_r = MAT_TORSO_TO_HEAD_RIGHT
-
-        # --- 3. 应用目标坐标系变换 (To Target Frame) ---
-        # 公式: T_target_to_obj = T_target_to_torso * T_torso_to_obj
-        
-        # A. 计算最终 EE Pose
-        mat_final_l_ee = np.dot(TRANSFORM_MAT, mat_torso_to_l_grip)
-        mat_final_r_ee = np.dot(TRANSFORM_MAT, mat_torso_to_r_grip)
-
-        # B. 计算最终相机 Pose
-        mat_final_l_wrist_cam = np.dot(TRANSFORM_MAT, mat_torso_to_l_wrist_cam)
-        mat_final_r_wrist_cam = np.dot(TRANSFORM_MAT, mat_torso_to_r_wrist_cam)
-        mat_final_head_l_cam  = np.dot(TRANSFORM_MAT, mat_torso_to_head_l)
-        mat_final_head_r_cam  = np.dot(TRANSFORM_MAT, mat_torso_to_head_r)
-
-        # --- 4. 封装数据 ---
-        
-        def pack_pose(prefix, mat):
+        TRANSFORM_MAT = None
+
+    def to_target(mat):
+        return mat if TRANSFORM_MAT is None else TRANSFORM_MAT @ mat
+
+    n = len(df)
+
+    # --- 1. 读取原始数据 (均在 Torso Frame 下) ---
+    # 整列堆叠为 (N,7) 数组 [x,y,z, qx,qy,qz,qw]，避免逐行 iterrows
+    l_ee_poses = np.stack(df['observation.state.left_ee_pose'].to_numpy()).reshape(n, 7)
+    r_ee_poses = np.stack(df['observation.state.right_ee_pose'].to_numpy()).reshape(n, 7)
+
+    # 批量转为 (N,4,4) 矩阵 (Relative to Torso)
+    mat_torso_to_l_grip = get_matrices(l_ee_poses)
+    mat_torso_to_r_grip = get_matrices(r_ee_poses)
+
+    # --- 2. 应用目标坐标系变换 (To Target Frame) ---
+    # 公式: T_target_to_obj = T_target_to_torso * T_torso_to_obj
+    mat_final_l_ee = to_target(mat_torso_to_l_grip)
+    mat_final_r_ee = to_target(mat_torso_to_r_grip)
+
+    # 腕部相机 (Target -> Grip -> Cam)，直接复用上面的 EE 结果，静态矩阵自动广播到每一帧
+    final_mats = {
+        'left_ee': mat_final_l_ee,
+        'right_ee': mat_final_r_ee,
+        'cam_left_wrist': mat_final_l_ee @ MAT_L_GRIP_TO_CAM,
+        'cam_right_wrist': mat_final_r_ee @ MAT_R_GRIP_TO_CAM,
+    }
+
+    # 头部相机 (Torso -> Head Cam) 是静态的，每帧结果相同，只需计算和转换一次
+    static_mats = {
+        'cam_head_left': to_target(MAT_TORSO_TO_HEAD_LEFT),
+        'cam_head_right': to_target(MAT_TORSO_TO_HEAD_RIGHT),
+    }
+
+    # --- 3. 封装数据 ---
+    timestamps = df['timestamp'].astype(float).tolist() if 'timestamp' in df.columns else None
+
+    if layout == 'columnar':
+        # 列式输出: 每个实体只保存 pos (N,3) / quat (N,4)，矩阵由读取方按需重建
+        entities = {}
+        for prefix, mats in final_mats.items():
+            pos, quat = get_pos_quats(mats)
+            entities[prefix] = {'pos': pos.tolist(), 'quat': quat.tolist()}
+        for prefix, mat in static_mats.items():
             p, q = get_pos_quat(mat)
-            # 保存为平铺格式 [x,y,z, qx,qy,qz,qw] 方便绘图脚本直接使用
-            frame_data[f'{prefix}_pose'] = p + q 
-            # 也可以保留拆分格式
-            frame_data[f'{prefix}_pos'] = p
-            frame_data[f'{prefix}_quat'] = q
-            frame_data[f'{prefix}_matrix'] = mat.tolist()
-
-        # 保存 EE (覆盖原名或新建，这里为了可视化兼容建议保留原名结构或清晰的新名)
-        # 注意：为了让 visualize_trajectory 能直接画出变换后的EE，我们通常需要更新 key
-        # 这里我保存为标准 key，这样可视化脚本读取时就是变换后的数据
-        pack_pose('left_ee', mat_final_l_ee)     # Output key: left_ee_pose
-        pack_pose('right_ee', mat_final_r_ee)    # Output key: right_ee_pose
-        
-        # 保存相机
-        pack_pose('cam_left_wrist', mat_final_l_wrist_cam)
-        pack_pose('cam_right_wrist', mat_final_r_wrist_cam)
-        pack_pose('cam_head_left', mat_final_head_l_cam)
-        pack_pose('cam_head_right', mat_final_head_r_cam)
+            entities[prefix] = {'pos': [p] * n, 'quat': [q] * n}
+        results = {'frame': target_frame, 'timestamps': timestamps, 'entities': entities}
 
-        # 保留时间戳
-        if 'timestamp' in row:
-            frame_data['timestamp'] = row['timestamp']
-        
-        results.append(frame_data)
+        # --- 4. 输出 JSON ---
+        with open(output_path, 'wb') as f:
+            f.write(dump_json(results))
+    else:
+        columns = build_columns(final_mats, static_mats, n, pose_only)
 
-    # --- 5. 输出 JSON ---
-    with open(output_path, 'w') as f:
-        json.dump(results, f, indent=4)
+        # --- 4. 输出 parquet / JSON (逐帧组装并流式写出) ---
+        if output_format == 'parquet':
+            write_parquet_frames(output_path, columns, timestamps)
+        else:
+            write_json_frames(output_path, iter_frames(columns, n, timestamps))
 
     print(f"处理完成！文件已保存至: {output_path}")
 
@@ -177,10 +251,17 @@ if __name__ == "__main__":
     parser.add_argument("--input", type=str, required=True, 
                         help="输入的 parquet 或 json 文件路径")
     parser.add_argument("--output", type=str, required=True, 
-                        help="输出的 json 文件路径")
+                        help="输出的 json (或 parquet) 文件路径")
     parser.add_argument("--frame", type=str, default="base_link", 
                         choices=["base_link", "torso_link3"],
                         help="目标参考坐标系：'base_link' (世界坐标) 或 'torso_link3' (躯干相对坐标)")
+    parser.add_argument("--layout", type=str, default="frames",
+                        choices=["frames", "columnar"],
+                        help="输出格式：'frames' (每帧一个dict，含 pose/pos/quat/matrix) 或 'columnar' (按实体存 pos/quat 数组，体积更小)")
+    parser.add_argument("--pose-only", action="store_true",
+                        help="frames 格式下每帧只输出 {name}_pose [x,y,z, qx,qy,qz,qw]，省略 _pos/_quat/_matrix")
+    parser.add_argument("--format", type=str, default=None, choices=["json", "parquet"],
+                        help="输出文件格式，默认按 --output 后缀推断；parquet 仅支持 frames 格式")
     
     # 可视化参数
     parser.add_argument("--visualize", nargs='*',
@@ -188,12 +269,18 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    output_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'json')
+    if output_format == 'parquet' and args.layout != 'frames':
+        parser.error("--format parquet 仅支持 --layout frames")
+    if args.pose_only and args.layout != 'frames':
+        parser.error("--pose-only 仅支持 --layout frames")
+
     # 强制检查输出后缀
-    if not args.output.endswith('.json'):
-        print("警告: 输出文件建议使用 .json 后缀。")
+    if not args.output.endswith('.' + output_format):
+        print(f"警告: 输出文件建议使用 .{output_format} 后缀。")
 
     # 执行主处理
-    process_file(args.input, args.output, args.frame)
+    process_file(args.input, args.output, args.frame, args.layout, args.pose_only, output_format)
 
     # 执行可视化
     if args.visualize is not None:
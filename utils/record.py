@@ -8,6 +8,9 @@ from datetime import datetime
 import argparse
 import json
 import shutil  # 用于删除文件夹
+import subprocess
+import queue
+import threading
 
 # 全局配置
 SAVE_ROOT = "./recordings"
@@ -17,6 +20,20 @@ VIDEO_EXT = '.mp4'
 # 可配置帧率
 VIDEO_FPS = 15.0
 
+# 彩色深度图的固定量程 (mm)：0..DEPTH_VIS_MAX_MM 线性映射到 JET 色表，超出部分饱和
+# 使用固定量程而非逐帧 MINMAX 归一化，颜色在帧间保持一致
+DEPTH_VIS_MAX_MM = 8000
+
+# 无损深度视频 (--lossless-depth): FFV1 + 16位灰度，保留原始深度值 (mm)
+LOSSLESS_DEPTH_EXT = '.mkv'
+
+# 每台相机后台写入队列的最大帧数，写入跟不上时采集循环会在此阻塞
+WRITE_QUEUE_SIZE = 64
+# 每台相机 SDK 回调帧队列的最大长度，满时丢弃最旧的帧 (SDK 帧缓冲池有限，不能长期占用)
+FRAME_QUEUE_SIZE = 8
+# CSV 文件写缓冲大小，攒满后一次写盘，避免每帧一行的小块写入
+CSV_BUFFER_SIZE = 1 << 20
+
 # 同步配置文件路径
 CONFIG_FILE_PATH = "/Users/psy/workspace/GalaxeaLeRobotToolkit/utils/multi_device_sync_config.json"
 
@@ -42,8 +59,84 @@ def sync_mode_from_str(sync_mode_str):
         return OBMultiDeviceSyncMode.FREE_RUN
 
 
-def setup_pipeline(device, serial, sync_config_dict=None):
-    """为指定设备创建并配置Pipeline"""
+class LosslessDepthWriter:
+    """
+    通过 ffmpeg 子进程将 uint16 深度帧无损编码为 FFV1 (gray16le)
+    接口与 cv2.VideoWriter 保持一致 (write / release)，分辨率取自第一帧
+    """
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.proc = None
+
+    def write(self, depth_data):
+        if self.proc is None:
+            height, width = depth_data.shape[:2]
+            cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'gray16le', '-s', f'{width}x{height}',
+                   '-r', str(self.fps), '-i', '-',
+                   '-c:v', 'ffv1', '-level', '3', self.path]
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        self.proc.stdin.write(np.ascontiguousarray(depth_data, dtype='<u2').data)
+
+    def release(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+
+def writer_worker(rec):
+    """
+    后台写入线程: 从队列取出帧并写入视频和CSV，收到 None 时退出
+    视频编码 (cv2.VideoWriter.write 会释放GIL) 与采集循环并行
+    """
+    write_queue = rec['write_queue']
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+        bgr_image, depth_image, csv_row, depth_row = item
+        try:
+            rec['rgb_writer'].write(bgr_image)
+            rec['depth_writer'].write(depth_image)
+            rec['csv_writer'].writerow(csv_row)
+            rec['depth_info_writer'].writerow(depth_row)
+        except Exception as e:
+            print(f"\n❌ 相机 {rec['index']} 写入第 {csv_row[0]} 帧失败: {e}")
+
+
+def make_frame_callback(rec, frame_ready):
+    """
+    创建 SDK 帧回调: 由 SDK 线程调用，把新帧放入该相机的队列并唤醒主循环
+    各相机异步交付帧，主循环不再逐个阻塞在 wait_for_frames 上
+    """
+    frame_queue = rec['frame_queue']
+
+    def on_new_frames(frames):
+        if frames is None:
+            return
+        # 记录到达时间，写入 CSV 的系统时间戳不受主循环处理延迟影响
+        item = (time.time_ns(), frames)
+        while True:
+            try:
+                frame_queue.put_nowait(item)
+                break
+            except queue.Full:
+                # 主循环跟不上时丢弃最旧的帧
+                try:
+                    frame_queue.get_nowait()
+                    rec['dropped_frames'] += 1
+                except queue.Empty:
+                    pass
+        frame_ready.set()
+
+    return on_new_frames
+
+
+def setup_pipeline(device, serial, sync_config_dict=None, frame_callback=None):
+    """为指定设备创建并配置Pipeline，指定 frame_callback 时以回调方式异步交付帧"""
     pipeline = Pipeline(device)
     config = Config()
 
@@ -82,10 +175,16 @@ def setup_pipeline(device, serial, sync_config_dict=None):
         # 启用彩色流
         color_profile_list = pipeline.get_stream_profile_list(OBSensorType.COLOR_SENSOR)
         if color_profile_list is not None:
-            color_profile = color_profile_list.get_video_stream_profile(640, 480, OBFormat.RGB, int(VIDEO_FPS))
-            if color_profile:
-                config.enable_stream(color_profile)
-                print(f"  [彩色] 640x480 RGB @{int(VIDEO_FPS)}fps")
+            # 优先请求 BGR，写视频时省去每帧 RGB->BGR 转换；设备不支持时退回 RGB
+            for format_name, color_format in (("BGR", OBFormat.BGR), ("RGB", OBFormat.RGB)):
+                try:
+                    color_profile = color_profile_list.get_video_stream_profile(640, 480, color_format, int(VIDEO_FPS))
+                except Exception:
+                    color_profile = None
+                if color_profile:
+                    config.enable_stream(color_profile)
+                    print(f"  [彩色] 640x480 {format_name} @{int(VIDEO_FPS)}fps")
+                    break
             else:
                 default_color_profile = color_profile_list.get_default_video_stream_profile()
                 config.enable_stream(default_color_profile)
@@ -93,14 +192,26 @@ def setup_pipeline(device, serial, sync_config_dict=None):
     except Exception as e:
         print(f"  彩色流配置异常: {e}")
     
-    pipeline.start(config)
+    if frame_callback is not None:
+        pipeline.start(config, frame_callback)
+    else:
+        pipeline.start(config)
     return pipeline
 
 def main():
     parser = argparse.ArgumentParser(description="Record from Orbbec cameras")
     parser.add_argument('--no-display', action='store_true', help='run in headless mode without GUI display')
+    parser.add_argument('--lossless-depth', action='store_true',
+                        help='record raw 16-bit depth losslessly (FFV1 .mkv via ffmpeg) instead of a JET colormap mp4')
     args = parser.parse_args()
     no_display = args.no_display
+    lossless_depth = args.lossless_depth
+    # 彩色深度图只用于预览和有损深度视频
+    need_colormap = not (lossless_depth and no_display)
+
+    if lossless_depth and shutil.which('ffmpeg') is None:
+        print("❌ --lossless-depth 需要 ffmpeg，但未在 PATH 中找到")
+        return
 
     # 初始化
     ctx = Context()
@@ -134,6 +245,8 @@ def main():
         os.makedirs(SAVE_ROOT)
     
     recorders = []
+    # 任一相机有新帧时由 SDK 回调置位，主循环无帧可处理时在此等待
+    frame_ready = threading.Event()
     timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
     # 本次会话的总目录
     session_dir = os.path.join(SAVE_ROOT, timestamp_str)
@@ -176,10 +289,6 @@ def main():
         os.makedirs(cam_dir, exist_ok=True)
         # 注意：这里不再需要 depth_raw 文件夹，因为改为视频录制了
         
-        # 配置并启动pipeline
-        device_sync_config = sync_configs.get(serial, {})
-        pipeline = setup_pipeline(device, serial, device_sync_config)
-        
         # --- RGB 视频写入器 ---
         rgb_video_path = os.path.join(cam_dir, f"rgb_video{VIDEO_EXT}")
         fourcc = cv2.VideoWriter_fourcc(*VIDEO_CODEC)
@@ -192,27 +301,31 @@ def main():
             rgb_writer = cv2.VideoWriter(rgb_video_path, fourcc, float(VIDEO_FPS), (640, 480))
 
         # --- Depth 视频写入器 (新增) ---
-        # 深度图分辨率为 640x400 (见 setup_pipeline)
-        depth_video_path = os.path.join(cam_dir, f"depth_video{VIDEO_EXT}")
-        # 使用相同的编码器
-        depth_writer = cv2.VideoWriter(depth_video_path, fourcc, float(VIDEO_FPS), (640, 400))
+        if lossless_depth:
+            # 原始 uint16 深度无损写入 FFV1，分辨率取自第一帧
+            depth_video_path = os.path.join(cam_dir, f"depth_video{LOSSLESS_DEPTH_EXT}")
+            depth_writer = LosslessDepthWriter(depth_video_path, VIDEO_FPS)
+        else:
+            # 深度图分辨率为 640x400 (见 setup_pipeline)
+            depth_video_path = os.path.join(cam_dir, f"depth_video{VIDEO_EXT}")
+            # 使用相同的编码器
+            depth_writer = cv2.VideoWriter(depth_video_path, fourcc, float(VIDEO_FPS), (640, 400))
         
         # 时间戳CSV文件
         csv_path = os.path.join(cam_dir, "timestamps.csv")
-        csv_file = open(csv_path, 'w', newline='')
+        csv_file = open(csv_path, 'w', newline='', buffering=CSV_BUFFER_SIZE)
         csv_writer = csv.writer(csv_file)
         csv_writer.writerow(["Frame_Index", "System_Timestamp_ns", "Device_Timestamp_us",
                            "RGB_Width", "RGB_Height", "Depth_Width", "Depth_Height", "Rel_Time_ms"])
         
         # 深度帧信息CSV (稍微调整，因为没有单个文件名了)
         depth_info_path = os.path.join(cam_dir, "depth_stats.csv")
-        depth_info_file = open(depth_info_path, 'w', newline='')
+        depth_info_file = open(depth_info_path, 'w', newline='', buffering=CSV_BUFFER_SIZE)
         depth_info_writer = csv.writer(depth_info_file)
         depth_info_writer.writerow(["Frame_Index", "Min_Distance", "Max_Distance", 
                                   "Mean_Distance", "Valid_Pixels"])
         
-        recorders.append({
-            'pipeline': pipeline,
+        rec = {
             'serial': serial,
             'index': i,
             'rgb_writer': rgb_writer,
@@ -224,8 +337,21 @@ def main():
             'cam_dir': cam_dir,
             'frame_idx': 0,
             'video_path': rgb_video_path,
-            'depth_video_path': depth_video_path
-        })
+            'depth_video_path': depth_video_path,
+            'write_queue': queue.Queue(maxsize=WRITE_QUEUE_SIZE),
+            'frame_queue': queue.Queue(maxsize=FRAME_QUEUE_SIZE),
+            'dropped_frames': 0,
+            'depth_norm_buf': None
+        }
+        recorders.append(rec)
+        
+        # 配置并启动pipeline (帧通过回调异步进入 rec['frame_queue'])
+        device_sync_config = sync_configs.get(serial, {})
+        rec['pipeline'] = setup_pipeline(device, serial, device_sync_config,
+                                         make_frame_callback(rec, frame_ready))
+        
+        rec['writer_thread'] = threading.Thread(target=writer_worker, args=(rec,), daemon=True)
+        rec['writer_thread'].start()
         
         print(f"  录制目录: {cam_dir}")
     
@@ -274,6 +400,10 @@ def main():
 
             # 暂停逻辑
             if recording_paused:
+                # 丢弃暂停期间到达的帧，继续录制时不写入旧帧
+                for rec in recorders:
+                    while not rec['frame_queue'].empty():
+                        rec['frame_queue'].get_nowait()
                 if not no_display:
                     for rec in recorders:
                         preview = np.zeros((480, 640*2, 3), dtype=np.uint8)
@@ -283,12 +413,14 @@ def main():
                     time.sleep(0.1)
                 continue
             
-            # 帧处理
+            # 帧处理: 从各相机的回调队列中取帧，互不阻塞
             frames_processed = 0
+            frame_ready.clear()
             for rec in recorders:
-                pipeline = rec['pipeline']
-                frames = pipeline.wait_for_frames(50)
-                if frames is None: continue
+                try:
+                    sys_ts_ns, frames = rec['frame_queue'].get_nowait()
+                except queue.Empty:
+                    continue
                 
                 color_frame = frames.get_color_frame()
                 depth_frame = frames.get_depth_frame()
@@ -300,63 +432,81 @@ def main():
                 # --- RGB 处理 ---
                 color_data = np.frombuffer(color_frame.get_data(), dtype=np.uint8)
                 color_data = color_data.reshape((color_frame.get_height(), color_frame.get_width(), 3))
-                bgr_image = cv2.cvtColor(color_data, cv2.COLOR_RGB2BGR)
-                rec['rgb_writer'].write(bgr_image)
+                if color_frame.get_format() == OBFormat.BGR:
+                    # 相机直接输出 BGR: 只需拷贝出 SDK 帧缓冲 (交给写入线程)，无需通道转换
+                    bgr_image = color_data.copy()
+                else:
+                    bgr_image = cv2.cvtColor(color_data, cv2.COLOR_RGB2BGR)
                 
                 # --- Depth 处理 (转为视频) ---
                 depth_data = np.frombuffer(depth_frame.get_data(), dtype=np.uint16)
                 depth_data = depth_data.reshape((depth_frame.get_height(), depth_frame.get_width()))
                 
-                # 1. 生成可视化彩色深度图用于保存为MP4 (因为MP4不支持16位灰度)
-                # 归一化: 0-255. 为了更好的可视化效果，可以截断过远的距离
-                # 这里简单地做 MINMAX 归一化
-                depth_norm = cv2.normalize(depth_data, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-                depth_colormap = cv2.applyColorMap(depth_norm, cv2.COLORMAP_JET)
+                # 1. 生成可视化彩色深度图用于预览以及保存为MP4 (因为MP4不支持16位灰度)
+                # 无损模式且无界面时用不到，直接跳过
+                # 按固定量程 0..DEPTH_VIS_MAX_MM 缩放到 0-255 (convertScaleAbs 一次遍历完成缩放和饱和截断)，
+                # 过远的距离统一截断为最远颜色
+                # 8位中间结果只在本帧内使用，复用同一块缓冲区；彩色结果会交给写入线程，仍需每帧新建
+                if need_colormap:
+                    if rec['depth_norm_buf'] is None or rec['depth_norm_buf'].shape != depth_data.shape:
+                        rec['depth_norm_buf'] = np.empty(depth_data.shape, dtype=np.uint8)
+                    depth_norm = cv2.convertScaleAbs(depth_data, dst=rec['depth_norm_buf'],
+                                                     alpha=255.0 / DEPTH_VIS_MAX_MM)
+                    depth_colormap = cv2.applyColorMap(depth_norm, cv2.COLORMAP_JET)
                 
-                # 写入深度视频文件
-                rec['depth_writer'].write(depth_colormap)
+                # 深度视频写入内容 (无损模式为原始 uint16 深度)
+                # depth_data 直接引用 SDK 帧缓冲，交给写入线程前需要拷贝
+                depth_image = depth_data.copy() if lossless_depth else depth_colormap
                 
                 # --- 记录数据 ---
-                sys_ts_ns = time.time_ns()
                 dev_ts_us = color_frame.get_timestamp()
                 rel_time_ms = (sys_ts_ns - start_time_ns) / 1e6
 
-                rec['csv_writer'].writerow([
+                csv_row = [
                     frame_idx, sys_ts_ns, dev_ts_us,
                     color_frame.get_width(), color_frame.get_height(),
                     depth_frame.get_width(), depth_frame.get_height(),
                     rel_time_ms
-                ])
+                ]
                 
-                # 统计信息
-                valid_depth = depth_data[depth_data > 0]
-                if len(valid_depth) > 0:
-                    min_dist, max_dist = np.min(valid_depth), np.max(valid_depth)
-                    mean_dist = np.mean(valid_depth)
-                    valid_pixels = len(valid_depth)
+                # 统计信息 (只统计非零的有效像素)
+                # 0 不影响 max 和求和；min 利用 uint16 减 1 回绕 (0 -> 65535) 排除无效像素，
+                # 避免先用布尔索引拷贝出有效像素子数组再多次遍历
+                valid_pixels = np.count_nonzero(depth_data)
+                if valid_pixels > 0:
+                    max_dist = int(depth_data.max())
+                    min_dist = int((depth_data - np.uint16(1)).min()) + 1
+                    mean_dist = int(depth_data.sum(dtype=np.uint64)) / valid_pixels
                 else:
                     min_dist = max_dist = mean_dist = valid_pixels = 0
                 
-                rec['depth_info_writer'].writerow([frame_idx, min_dist, max_dist, mean_dist, valid_pixels])
-                
-                # --- 预览显示 ---
-                # 为了预览一致，调整深度图大小匹配RGB
-                if depth_colormap.shape[:2] != bgr_image.shape[:2]:
-                    depth_display_resized = cv2.resize(depth_colormap, (bgr_image.shape[1], bgr_image.shape[0]))
-                else:
-                    depth_display_resized = depth_colormap
-                    
-                preview = np.hstack((bgr_image, depth_display_resized))
+                depth_row = [frame_idx, min_dist, max_dist, mean_dist, valid_pixels]
                 
-                info_text = f"Cam {rec['index']} | Fr: {frame_idx} | {rel_time_ms:.1f}ms"
-                cv2.putText(preview, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                # 视频编码和CSV写入交给后台线程
+                rec['write_queue'].put((bgr_image, depth_image, csv_row, depth_row))
                 
+                # --- 预览显示 (headless 模式下全部跳过) ---
                 if not no_display:
+                    # 为了预览一致，调整深度图大小匹配RGB
+                    if depth_colormap.shape[:2] != bgr_image.shape[:2]:
+                        depth_display_resized = cv2.resize(depth_colormap, (bgr_image.shape[1], bgr_image.shape[0]))
+                    else:
+                        depth_display_resized = depth_colormap
+                        
+                    preview = np.hstack((bgr_image, depth_display_resized))
+                    
+                    info_text = f"Cam {rec['index']} | Fr: {frame_idx} | {rel_time_ms:.1f}ms"
+                    cv2.putText(preview, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    
                     cv2.imshow(f"Camera {rec['index']} - {rec['serial'][-6:]}", preview)
                 
                 rec['frame_idx'] += 1
                 frames_processed += 1
             
+            # 所有相机都没有新帧时等待回调唤醒，避免空转
+            if frames_processed == 0:
+                frame_ready.wait(0.05)
+            
             # 定时状态输出
             current_time = time.time()
             if current_time - last_status_time > 5 and frames_processed > 0:
@@ -379,6 +529,9 @@ def main():
         for rec in recorders:
             try:
                 rec['pipeline'].stop()
+                # 等待后台写入线程写完队列中剩余的帧
+                rec['write_queue'].put(None)
+                rec['writer_thread'].join()
                 rec['rgb_writer'].release()
                 rec['depth_writer'].release() # 释放深度视频写入器
                 rec['csv_file'].close()
@@ -391,6 +544,8 @@ def main():
             print("\n✅ 数据已保存。")
             for rec in recorders:
                 print(f"  [Cam {rec['index']}] 帧数: {rec['frame_idx']}")
+                if rec['dropped_frames']:
+                    print(f"    丢弃帧数:  {rec['dropped_frames']} (处理跟不上相机帧率)")
                 print(f"    RGB视频:   {rec['video_path']}")
                 print(f"    深度视频:  {rec['depth_video_path']}")
             print(f"  数据根目录: {session_dir}")
@@ -3,10 +3,54 @@ import numpy as np
 from pyorbbecsdk import *
 import time
 import threading
-from queue import Queue
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from text_stamp import stamp_line
 VIDEO_FPS = 15.0
+# 预览刷新率，低于采集帧率，期间的帧在槽位中被直接覆盖
+DISPLAY_FPS = 10.0
+
+# 深度彩色图的固定量程 (mm)：0..DEPTH_VIS_MAX_MM 线性映射到 JET 色表，超出部分饱和
+DEPTH_VIS_MAX_MM = 8000
+
+def build_depth_lut(max_mm=DEPTH_VIS_MAX_MM):
+    """预计算 65536 项的 深度值(uint16) -> JET 颜色(BGR) 查找表，缩放和上色合并为一次查表"""
+    levels = np.minimum(np.rint(np.arange(65536) * (255.0 / max_mm)), 255).astype(np.uint8)
+    jet = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(-1, 1), cv2.COLORMAP_JET).reshape(256, 3)
+    return jet[levels]
+
+DEPTH_LUT = build_depth_lut()
+
+# 画面叠加文字的字形缓存 (按字号分开)，各相机线程共用
+LABEL_STAMPS = {}
+TS_STAMPS = {}
+
+# 每台相机的画面槽位数: 一块正在显示、一块为最新帧、一块供采集线程写入
+FRAME_SLOTS = 3
+
+def publish_frame(pipeline_info, slot, frame_count, timestamp):
+    """采集线程写完 slot 后将其发布为最新帧，未显示的旧帧被直接覆盖"""
+    with pipeline_info['lock']:
+        pipeline_info['latest'] = slot
+        pipeline_info['seq'] += 1
+        pipeline_info['frame_count'] = frame_count
+        pipeline_info['timestamp'] = timestamp
+    pipeline_info['frame_event'].set()
+
+def acquire_latest_frame(pipeline_info, last_seq=-1):
+    """取出最新帧 (比 last_seq 新时)，返回 (seq, frame)，使用完须调用 release_frame"""
+    with pipeline_info['lock']:
+        slot = pipeline_info['latest']
+        if slot is None or pipeline_info['seq'] == last_seq:
+            return None
+        pipeline_info['reading'] = slot
+        return pipeline_info['seq'], pipeline_info['buffers'][slot]
+
+def release_frame(pipeline_info):
+    with pipeline_info['lock']:
+        pipeline_info['reading'] = None
+
 def setup_camera_pipeline(device, camera_index):
     """为单台相机配置并启动Pipeline"""
     device_info = device.get_device_info()
@@ -68,7 +112,15 @@ def setup_camera_pipeline(device, camera_index):
                 'pipeline': pipeline,
                 'serial': serial,
                 'index': camera_index,
-                'errors': []
+                'errors': [],
+                # 画面槽位: 采集线程与显示线程通过 latest/reading 下标交接，无需队列
+                'lock': threading.Lock(),
+                'buffers': None,
+                'latest': None,
+                'reading': None,
+                'seq': 0,
+                'frame_count': 0,
+                'timestamp': 0
             }
         except Exception as e:
             error_msgs.append(f"相机{camera_index}: 启动失败 - {str(e)[:50]}")
@@ -81,7 +133,14 @@ def setup_camera_pipeline(device, camera_index):
         'errors': error_msgs
     }
 
-def camera_capture_worker(pipeline_info, frame_queue, stop_event):
+def save_frame(filename, frame, camera_index):
+    """保存线程中执行: PNG 编码和写盘，不阻塞显示循环"""
+    if cv2.imwrite(filename, frame):
+        print(f"💾 保存相机{camera_index}帧: {filename}")
+    else:
+        print(f"❌ 保存相机{camera_index}帧失败: {filename}")
+
+def camera_capture_worker(pipeline_info, stop_event):
     """相机捕获工作线程"""
     pipeline = pipeline_info['pipeline']
     camera_index = pipeline_info['index']
@@ -90,6 +149,11 @@ def camera_capture_worker(pipeline_info, frame_queue, stop_event):
     frame_count = 0
     last_log_time = time.time()
     consecutive_timeouts = 0  # 添加连续超时计数
+    missing_color = 0  # 缺失彩色帧计数 (每个相机线程各自计数)
+    missing_depth = 0  # 缺失深度帧计数
+    cam_label = f"Cam{camera_index}: {serial[-6:]}"
+    
+    depth_resized = None  # 深度图缩放的目标缓冲区，分辨率固定，只分配一次
     
     while not stop_event.is_set():
         try:
@@ -109,68 +173,77 @@ def camera_capture_worker(pipeline_info, frame_queue, stop_event):
             depth_frame = frames.get_depth_frame()
             
             if color_frame is None:
-                frame_count_debug = getattr(camera_capture_worker, 'debug_color', 0) + 1
-                camera_capture_worker.debug_color = frame_count_debug
-                if frame_count_debug % 50 == 0:
-                    print(f"⚠️ 相机{camera_index}color_frame为None (debug#{frame_count_debug})")
+                missing_color += 1
+                if missing_color % 50 == 0:
+                    print(f"⚠️ 相机{camera_index}color_frame为None (debug#{missing_color})")
                 continue
             
             if depth_frame is None:
-                frame_count_debug = getattr(camera_capture_worker, 'debug_depth', 0) + 1
-                camera_capture_worker.debug_depth = frame_count_debug
-                if frame_count_debug % 50 == 0:
-                    print(f"⚠️ 相机{camera_index}depth_frame为None (debug#{frame_count_debug})")
+                missing_depth += 1
+                if missing_depth % 50 == 0:
+                    print(f"⚠️ 相机{camera_index}depth_frame为None (debug#{missing_depth})")
                 continue
             
-            # 处理彩色帧
-            color_data = np.frombuffer(color_frame.get_data(), dtype=np.uint8)
+            # 处理彩色帧 (RGB 时直接按 (H, W, 3) 包装 SDK 缓冲区，省去中间的一维数组)
+            color_buf = color_frame.get_data()
             color_width = color_frame.get_width()
             color_height = color_frame.get_height()
             
             if color_frame.get_format() == OBFormat.RGB:
-                color_data = color_data.reshape((color_height, color_width, 3))
-                color_image = cv2.cvtColor(color_data, cv2.COLOR_RGB2BGR)
+                color_data = np.ndarray((color_height, color_width, 3), dtype=np.uint8, buffer=color_buf)
+                # RGB->BGR 只是通道反序，用视图代替 cvtColor，后续拼接时才真正拷贝
+                color_image = color_data[:, :, ::-1]
             else:
-                color_data = color_data.reshape((color_height, color_width, -1))
+                color_data = np.frombuffer(color_buf, dtype=np.uint8).reshape((color_height, color_width, -1))
                 color_image = color_data
             
             # 处理深度帧
-            depth_data = np.frombuffer(depth_frame.get_data(), dtype=np.uint16)
+            depth_buf = depth_frame.get_data()
             depth_width = depth_frame.get_width()
             depth_height = depth_frame.get_height()
             
-            if len(depth_data) > 0:
-                depth_data = depth_data.reshape((depth_height, depth_width))
-                depth_normalized = cv2.normalize(depth_data, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-                depth_image = cv2.applyColorMap(depth_normalized, cv2.COLORMAP_JET)
+            if len(depth_buf) > 0:
+                depth_data = np.ndarray((depth_height, depth_width), dtype=np.uint16, buffer=depth_buf)
+                # 一次查表完成缩放+上色，不再逐帧 MINMAX 扫描
+                depth_image = DEPTH_LUT[depth_data]
             else:
                 depth_image = np.zeros((depth_height, depth_width, 3), dtype=np.uint8)
             
             # 调整深度图尺寸以匹配彩色图
+            # 深度图已是伪彩色，最近邻插值即可，且写入复用的缓冲区避免逐帧分配
             if depth_image.shape[:2] != color_image.shape[:2]:
-                depth_image = cv2.resize(depth_image, (color_image.shape[1], color_image.shape[0]))
+                if depth_resized is None or depth_resized.shape[:2] != color_image.shape[:2]:
+                    depth_resized = np.empty((color_image.shape[0], color_image.shape[1], 3), dtype=np.uint8)
+                cv2.resize(depth_image, (color_image.shape[1], color_image.shape[0]),
+                           dst=depth_resized, interpolation=cv2.INTER_NEAREST)
+                depth_image = depth_resized
             
-            # 水平拼接
-            combined = np.hstack((color_image, depth_image))
+            # 水平拼接: 直接写入预分配槽位的左右两半，不再逐帧 hstack 分配
+            # 写入的槽位既不是最新帧也不是正在显示的帧
+            h, w = color_image.shape[:2]
+            with pipeline_info['lock']:
+                buffers = pipeline_info['buffers']
+                if buffers is None or buffers[0].shape[:2] != (h, 2 * w):
+                    buffers = [np.empty((h, 2 * w, 3), dtype=np.uint8) for _ in range(FRAME_SLOTS)]
+                    pipeline_info['buffers'] = buffers
+                    pipeline_info['latest'] = None
+                    pipeline_info['reading'] = None
+                busy = (pipeline_info['latest'], pipeline_info['reading'])
+                slot = next(i for i in range(FRAME_SLOTS) if i not in busy)
+            combined = buffers[slot]
+            combined[:, :w] = color_image
+            combined[:, w:] = depth_image
             
-            # 添加相机信息
-            cv2.putText(combined, f"Cam{camera_index}: {serial[-6:]}", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(combined, f"Frame: {frame_count}", 
-                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            # 添加相机信息 (贴预渲染文字，不再逐帧 putText)
+            stamp_line(combined, LABEL_STAMPS, (cam_label,), (10, 30), 0.7, 2, (0, 255, 0))
+            stamp_line(combined, LABEL_STAMPS, ("Frame: ", *str(frame_count)), (10, 60), 0.7, 2, (0, 255, 0))
             
             # 添加时间戳
             timestamp = color_frame.get_timestamp()
-            cv2.putText(combined, f"TS: {timestamp/1e6:.2f}ms", 
-                       (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            stamp_line(combined, TS_STAMPS, ("TS: ", *f"{timestamp/1e6:.2f}", "ms"), (10, 90), 0.6, 2, (255, 255, 255))
             
-            # 添加到队列
-            frame_queue.put({
-                'camera_index': camera_index,
-                'frame': combined,
-                'frame_count': frame_count,
-                'timestamp': timestamp
-            })
+            # 发布为最新帧
+            publish_frame(pipeline_info, slot, frame_count, timestamp)
             
             frame_count += 1
             
@@ -189,6 +262,9 @@ def camera_capture_worker(pipeline_info, frame_queue, stop_event):
     print(f"相机{camera_index}捕获线程结束")
 
 def main():
+    # 每台相机已有独立的采集线程，OpenCV 内部不再多线程并行，避免线程数 x 核数的超额订阅
+    cv2.setNumThreads(1)
+    
     # 初始化上下文
     ctx = Context()
     device_list = ctx.query_devices()
@@ -218,16 +294,19 @@ def main():
     
     print(f"\n🎯 成功启动 {len(pipelines)} 台相机")
     
-    # 创建帧队列和停止事件
-    frame_queue = Queue(maxsize=20)
+    # 创建停止事件
     stop_event = threading.Event()
+    # 任一相机发布新帧时置位，显示循环无新帧时阻塞等待，而不是轮询
+    frame_event = threading.Event()
+    for pipeline_info in pipelines:
+        pipeline_info['frame_event'] = frame_event
     
     # 启动捕获线程
     capture_threads = []
     for pipeline_info in pipelines:
         thread = threading.Thread(
             target=camera_capture_worker,
-            args=(pipeline_info, frame_queue, stop_event),
+            args=(pipeline_info, stop_event),
             daemon=True
         )
         thread.start()
@@ -262,28 +341,43 @@ def main():
     display_enabled = True
     last_fps_time = time.time()
     fps_frame_count = 0
+    last_seqs = {pipeline_info['index']: -1 for pipeline_info in pipelines}
+    last_display_times = {pipeline_info['index']: 0.0 for pipeline_info in pipelines}
+    # 's' 键保存交给后台线程，按键去抖代替原来的 sleep(0.3)
+    io_pool = ThreadPoolExecutor(max_workers=2)
+    last_save_time = 0.0
     
     try:
         while True:
-            # 处理所有待显示的帧
-            frames_to_display = {}
-            while not frame_queue.empty():
-                frame_data = frame_queue.get_nowait()
-                frames_to_display[frame_data['camera_index']] = frame_data
-            
-            # 显示帧
-            if display_enabled and frames_to_display:
-                for camera_index, frame_data in frames_to_display.items():
-                    window_name = window_names[camera_index]
-                    cv2.imshow(window_name, frame_data['frame'])
+            # 显示各相机的最新帧 (期间跳过的旧帧直接丢弃)
+            frame_event.clear()
+            displayed = False
+            if display_enabled:
+                now = time.time()
+                for pipeline_info in pipelines:
+                    camera_index = pipeline_info['index']
+                    # 按 DISPLAY_FPS 限制每个窗口的刷新
+                    if now - last_display_times[camera_index] < 1.0 / DISPLAY_FPS:
+                        continue
+                    latest = acquire_latest_frame(pipeline_info, last_seqs[camera_index])
+                    if latest is None:
+                        continue
+                    last_seqs[camera_index], frame = latest
+                    last_display_times[camera_index] = now
+                    try:
+                        cv2.imshow(window_names[camera_index], frame)
+                    finally:
+                        release_frame(pipeline_info)
+                    displayed = True
                 
-                fps_frame_count += 1
+                if displayed:
+                    fps_frame_count += 1
             
             # 计算并显示FPS
             current_time = time.time()
             if current_time - last_fps_time >= 1.0:
                 fps = fps_frame_count / (current_time - last_fps_time)
-                print(f"\r📊 显示FPS: {fps:.1f} | 按'q'退出 | 队列大小: {frame_queue.qsize()}", end="")
+                print(f"\r📊 显示FPS: {fps:.1f} | 按'q'退出", end="")
                 fps_frame_count = 0
                 last_fps_time = current_time
             
@@ -293,18 +387,24 @@ def main():
             if key == ord('q') or key == 27:  # 'q' 或 ESC
                 print("\n\n🛑 用户请求退出")
                 break
-            elif key == ord('s'):  # 保存当前帧
+            elif key == ord('s') and time.time() - last_save_time >= 0.3:  # 保存当前帧 (0.3s 内重复按键忽略)
+                last_save_time = time.time()
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
                 save_dir = "saved_frames"
                 os.makedirs(save_dir, exist_ok=True)
                 
-                for camera_index, frame_data in frames_to_display.items():
+                for pipeline_info in pipelines:
+                    latest = acquire_latest_frame(pipeline_info)
+                    if latest is None:
+                        continue
+                    # 槽位会被采集线程复用，拷贝一份再交给保存线程
+                    try:
+                        frame = latest[1].copy()
+                    finally:
+                        release_frame(pipeline_info)
+                    camera_index = pipeline_info['index']
                     filename = f"{save_dir}/cam{camera_index}_{timestamp}.png"
-                    cv2.imwrite(filename, frame_data['frame'])
-                    print(f"💾 保存相机{camera_index}帧: {filename}")
-                
-                # 添加短暂延迟防止重复保存
-                time.sleep(0.3)
+                    io_pool.submit(save_frame, filename, frame, camera_index)
             elif key == ord('p'):  # 暂停/继续显示
                 display_enabled = not display_enabled
                 status = "继续" if display_enabled else "暂停"
@@ -320,8 +420,9 @@ def main():
                                    (470, 280), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
                         cv2.imshow(window_name, blank_frame)
             
-            # 控制循环频率
-            time.sleep(0.001)
+            # 没有新帧时等待采集线程唤醒 (超时保证窗口事件仍被及时处理)
+            if not displayed:
+                frame_event.wait(0.033)
     
     except KeyboardInterrupt:
         print("\n\n⚠️  检测到中断信号")
@@ -348,16 +449,12 @@ def main():
                 except Exception as e:
                     print(f"❌ 停止相机{pipeline_info['index']}时出错: {e}")
         
+        # 等待未完成的保存
+        io_pool.shutdown(wait=True)
+        
         # 关闭所有窗口
         cv2.destroyAllWindows()
         
-        # 清空队列
-        while not frame_queue.empty():
-            try:
-                frame_queue.get_nowait()
-            except:
-                pass
-        
         print("\n🎉 程序结束，所有资源已释放")
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from text_stamp import TEXT_FONT, stamp_line
+
+
+def background():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(120, 400, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("chunks, scale, color", [
+    (("Frame: ", *"123"), 0.7, (0, 255, 0)),
+    (("TS: ", *"12.34", "ms"), 0.6, (255, 255, 255)),
+    (("Frame: ", *"9876543"), 0.7, (0, 255, 0)),
+    (("TS: ", *"-0.05", "ms"), 0.6, (255, 255, 255)),
+])
+def test_stamp_line_matches_put_text(chunks, scale, color):
+    expected = background()
+    cv2.putText(expected, ''.join(chunks), (10, 60), TEXT_FONT, scale, color, 2)
+    stamped = background()
+    stamp_line(stamped, {}, chunks, (10, 60), scale, 2, color)
+    assert np.count_nonzero(np.any(stamped != expected, axis=2)) == 0
+
+
+def test_stamp_line_reuses_cache_across_frames():
+    cache = {}
+    for frame_count in (7, 123, 124):
+        chunks = ("Frame: ", *str(frame_count))
+        expected = background()
+        cv2.putText(expected, ''.join(chunks), (10, 60), TEXT_FONT, 0.7, (0, 255, 0), 2)
+        stamped = background()
+        stamp_line(stamped, cache, chunks, (10, 60), 0.7, 2, (0, 255, 0))
+        assert np.count_nonzero(np.any(stamped != expected, axis=2)) == 0
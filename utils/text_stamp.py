@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+# 画面叠加文字: 字形用 putText 光栅化一次后缓存为掩码，逐帧按掩码贴到画面上，结果与直接 putText 逐像素一致
+TEXT_FONT = cv2.FONT_HERSHEY_SIMPLEX
+XY_SHIFT = 16  # putText 内部定点坐标的小数位数
+
+def text_units(text):
+    """字库单位下的前进宽度: fontScale=1、thickness=1 时 getTextSize 的宽度即 units + 1"""
+    return cv2.getTextSize(text, TEXT_FONT, 1.0, 1)[0][0] - 1
+
+# 各字库宽度对应的一个可见字符，用来拼填充前缀
+FILLER_CHARS = {}
+for _code in range(33, 127):
+    FILLER_CHARS.setdefault(text_units(chr(_code)), chr(_code))
+SPACE_UNITS = text_units(' ')
+
+def _renders_binary():
+    """OpenCV 5 起 putText 改为抗锯齿字体，掩码贴字无法复现混色，此时退回逐帧 putText"""
+    probe = np.zeros((40, 80), dtype=np.uint8)
+    cv2.putText(probe, '0.', (2, 30), TEXT_FONT, 0.7, 255, 2)
+    return bool(np.isin(probe, (0, 255)).all())
+
+STAMP_EXACT = _renders_binary()
+
+def filler_text(units):
+    """拼一段恰好 units 宽、以空格结尾的文字
+
+    putText 按字库单位 * round(scale * 2^16) 的定点坐标前进，字形的亚像素相位取决于它前面的总宽度。
+    先画同宽的填充前缀再画目标文字，就能得到目标文字在该相位上的像素；末尾的空格把填充和目标隔开。
+    """
+    target = units - SPACE_UNITS
+    if target < 0:
+        raise ValueError(f"cannot build a {units}-unit filler")
+    best = {0: ''}
+    for u in range(1, target + 1):
+        for width, ch in FILLER_CHARS.items():
+            prev = best.get(u - width)
+            if prev is not None and (u not in best or len(prev) + 1 < len(best[u])):
+                best[u] = prev + ch
+    if target not in best:
+        raise ValueError(f"cannot build a {units}-unit filler")
+    return best[target] + ' '
+
+def render_text_stamp(text, scale, thickness, units=0):
+    """预渲染一段文字，units 为它在整行中前面文字的总宽度; 返回 (掩码, 基线以上高度, 相对行起点的 x 偏移, 自身宽度)"""
+    filler = filler_text(units) if units else ''
+    (width, height), baseline = cv2.getTextSize(filler + text, TEXT_FONT, scale, thickness)
+    pad = thickness
+    shape = (height + baseline + 2 * pad, width + 2 * pad)
+    org = (pad, height + pad)
+    canvas = np.zeros(shape, dtype=np.uint8)
+    cv2.putText(canvas, filler + text, org, TEXT_FONT, scale, 255, thickness)
+    if filler:
+        under = np.zeros(shape, dtype=np.uint8)
+        cv2.putText(under, filler, org, TEXT_FONT, scale, 255, thickness)
+        canvas[under > 0] = 0
+    # 目标文字起点的整数像素位置; 笔画最多向左越过起点 pad 个像素
+    start = (units * int(round(scale * (1 << XY_SHIFT)))) >> XY_SHIFT
+    return canvas[:, start:] > 0, height + pad, start - pad, text_units(text)
+
+def stamp_text(image, stamp, org, color):
+    """在整行起点 org (与 putText 相同的左下基线坐标) 处贴上预渲染文字"""
+    mask, ascent, dx, _ = stamp
+    x, y = org[0] + dx, org[1] - ascent
+    region = image[y:y + mask.shape[0], x:x + mask.shape[1]]
+    region[mask[:region.shape[0], :region.shape[1]]] = color
+
+def stamp_line(image, cache, chunks, org, scale, thickness, color):
+    """把若干段文字按 putText 的前进方式贴成一行，等价于 putText(''.join(chunks))
+
+    cache 以 (文字, 前面的总宽度) 为键缓存字形，同一个 cache 只能用于同一组 scale/thickness。
+    """
+    if not STAMP_EXACT:
+        cv2.putText(image, ''.join(chunks), org, TEXT_FONT, scale, color, thickness)
+        return
+    units = 0
+    for chunk in chunks:
+        key = (chunk, units)
+        stamp = cache.get(key)
+        if stamp is None:
+            stamp = cache[key] = render_text_stamp(chunk, scale, thickness, units)
+        stamp_text(image, stamp, org, color)
+        units += stamp[3]
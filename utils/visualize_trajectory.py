@@ -8,6 +8,12 @@ import os
 import numpy as np
 import pandas as pd
 
+# orjson 解析速度显著快于标准库 json，未安装时退回 json.load
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 轨迹样式配置
 STYLES = {
     'cam_left_wrist': {'color': 'blue', 'linestyle': '-', 'label': 'L-Wrist Cam'},
@@ -22,27 +28,56 @@ STYLES = {
 def load_data(file_path):
     ext = os.path.splitext(file_path)[1].lower()
     if ext == '.parquet':
-        return pd.read_parquet(file_path).to_dict(orient='records')
+        # 直接返回 DataFrame，按列整体提取，不再逐行转成 dict
+        return pd.read_parquet(file_path)
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
     with open(file_path, 'r') as f:
         return json.load(f)
 
+def stack_points(values):
+    """把一列 [x, y, z, ...] 合并为 (N, 3) 数组，跳过缺失或不足3维的条目"""
+    try:
+        arr = np.array(list(values), dtype=np.float64)
+        if arr.ndim == 2 and arr.shape[1] >= 3:
+            return arr[:, :3]
+    except (ValueError, TypeError):
+        pass
+    # 含缺失值或长度不一致时逐条过滤
+    points = [val[:3] for val in values if val is not None and len(val) >= 3]
+    return np.array(points) if points else None
+
 def extract_trajectories(data):
     trajs = {}
-    if not data: return trajs
-    sample = data[0]
+    if isinstance(data, pd.DataFrame):
+        # parquet: 按列整体取出
+        if data.empty: return trajs
+        sample = dict.fromkeys(data.columns)
+        get_column = lambda key: data[key].to_numpy()
+    else:
+        if not data: return trajs
+        # process_camera_poses --layout columnar 输出: {'entities': {name: {'pos': [...], 'quat': [...]}}}
+        if isinstance(data, dict) and 'entities' in data:
+            for name, entity in data['entities'].items():
+                if entity.get('pos'):
+                    trajs[name] = np.asarray(entity['pos'])[:, :3]
+            return trajs
+        sample = data[0]
+        get_column = lambda key: [frame.get(key) for frame in data]
     keys_to_extract = [k for k in sample.keys() if k.endswith('_pos')]
     if 'left_ee_pose' in sample: keys_to_extract.append('left_ee_pose')
     if 'right_ee_pose' in sample: keys_to_extract.append('right_ee_pose')
+    # process_camera_poses --pose-only 输出只有 {name}_pose，没有对应的 _pos
+    keys_to_extract += [k for k in sample.keys()
+                        if k.endswith('_pose') and k[:-len('_pose')] + '_pos' not in sample
+                        and k not in keys_to_extract]
 
     for key in keys_to_extract:
-        points = []
-        for frame in data:
-            val = frame.get(key)
-            if val and len(val) >= 3:
-                points.append(val[:3])
-        if points:
-            clean_name = key.replace('_pos', '').replace('_pose', '')
-            trajs[clean_name] = np.array(points)
+        points = stack_points(get_column(key))
+        if points is not None:
+            clean_name = key[:-len('_pose')] if key.endswith('_pose') else key[:-len('_pos')]
+            trajs[clean_name] = points
     return trajs
 
 def setup_3d_axes(ax, trajs, title):
@@ -51,28 +86,29 @@ def setup_3d_axes(ax, trajs, title):
     ax.set_zlabel('Z (m)')
     ax.set_title(title)
     
-    all_points = np.vstack(list(trajs.values()))
-    max_range = (all_points.max(axis=0) - all_points.min(axis=0)).max() / 2.0
-    mid_point = (all_points.max(axis=0) + all_points.min(axis=0)) / 2.0
+    # 逐条轨迹求 min/max 再合并，不拼接出包含所有点的大数组
+    mins = np.min([t.min(axis=0) for t in trajs.values()], axis=0)
+    maxs = np.max([t.max(axis=0) for t in trajs.values()], axis=0)
+    max_range = (maxs - mins).max() / 2.0
+    mid_point = (maxs + mins) / 2.0
     
     ax.set_xlim(mid_point[0] - max_range, mid_point[0] + max_range)
     ax.set_ylim(mid_point[1] - max_range, mid_point[1] + max_range)
     ax.set_zlim(mid_point[2] - max_range, mid_point[2] + max_range)
 
 def plot_animated_trajectories(file_paths, reference_frame="Unknown"):
-    if isinstance(file_paths, str):
-        file_paths = [file_paths]
+    # file_paths 也可以直接传入已提取好的 {source_name: trajs}，避免重复读取和解析文件
+    if isinstance(file_paths, dict):
+        all_source_trajs = file_paths
+    else:
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        all_source_trajs = {}
+        for path in file_paths:
+            data = load_data(path)
+            all_source_trajs[os.path.basename(path)] = extract_trajectories(data)
 
-    all_source_trajs = {}
-    max_len = 0
-    
-    for path in file_paths:
-        data = load_data(path)
-        trajs = extract_trajectories(data)
-        source_name = os.path.basename(path)
-        all_source_trajs[source_name] = trajs
-        for t in trajs.values():
-            max_len = max(max_len, len(t))
+    max_len = max((len(t) for trajs in all_source_trajs.values() for t in trajs.values()), default=0)
 
     if max_len == 0:
         print("错误: 未找到有效轨迹数据。")
@@ -102,6 +138,10 @@ def plot_animated_trajectories(file_paths, reference_frame="Unknown"):
                 'line': line, 
                 'point': point, 
                 'coords': coords, 
+                # 预先拆成连续的一维 x/y/z，逐帧切片是廉价视图
+                'xs': np.ascontiguousarray(coords[:, 0]),
+                'ys': np.ascontiguousarray(coords[:, 1]),
+                'zs': np.ascontiguousarray(coords[:, 2]),
                 'name': style.get('label', name),
                 'color': style['color']
             })
@@ -115,6 +155,9 @@ def plot_animated_trajectories(file_paths, reference_frame="Unknown"):
                            verticalalignment='top', horizontalalignment='right',
                            bbox=dict(boxstyle='round,pad=0.5', facecolor='white', alpha=0.8, edgecolor='gray'))
 
+    # 每帧会变化的图元
+    artists = [el['line'] for el in plot_elements] + [el['point'] for el in plot_elements] + [stats_text]
+
     state = {'paused': False, 'frame': 0}
 
     def update(n):
@@ -131,8 +174,8 @@ def plot_animated_trajectories(file_paths, reference_frame="Unknown"):
             idx = min(curr, len(c) - 1)
             
             # 更新 3D 绘图
-            el['line'].set_data(c[:idx+1, 0], c[:idx+1, 1])
-            el['line'].set_3d_properties(c[:idx+1, 2])
+            el['line'].set_data(el['xs'][:idx+1], el['ys'][:idx+1])
+            el['line'].set_3d_properties(el['zs'][:idx+1])
             el['point'].set_data([c[idx, 0]], [c[idx, 1]])
             el['point'].set_3d_properties([c[idx, 2]])
             
@@ -143,7 +186,7 @@ def plot_animated_trajectories(file_paths, reference_frame="Unknown"):
         # 更新右上角文字
         stats_text.set_text("\n".join(info_lines))
         
-        return [el['line'] for el in plot_elements] + [el['point'] for el in plot_elements] + [stats_text]
+        return artists
 
     def on_keypress(event):
         if event.key == ' ':
@@ -157,6 +200,7 @@ def plot_animated_trajectories(file_paths, reference_frame="Unknown"):
             print(f"保存成功: {save_path}")
 
     fig.canvas.mpl_connect('key_press_event', on_keypress)
+    # mplot3d 旋转/缩放时会完整重绘，blit 缓存的背景随之失效，交互式 3D 播放不使用 blit
     ani = animation.FuncAnimation(fig, update, frames=max_len, interval=50, blit=False)
     
     plt.tight_layout()
@@ -194,7 +238,7 @@ def main():
         # or a modified version of plot_animated_trajectories
         save_trajectory_as_gif(all_poses, args.frame, args.save_gif, args.fps)
     else:
-        plot_animated_trajectories(args.files, args.frame)
+        plot_animated_trajectories(all_poses, args.frame)
 
 # ADD THIS HELPER FUNCTION if it's missing to handle the save
 def save_trajectory_as_gif(all_poses, reference_frame, output_path, fps):
@@ -211,7 +255,10 @@ def save_trajectory_as_gif(all_poses, reference_frame, output_path, fps):
             style = STYLES.get(name, STYLES['default'])
             line, = ax.plot([], [], [], color=style['color'], linestyle=style['linestyle'])
             point, = ax.plot([], [], [], color=style['color'], marker='o')
-            plot_elements.append({'line': line, 'point': point, 'coords': coords})
+            plot_elements.append({'line': line, 'point': point, 'coords': coords,
+                                  'xs': np.ascontiguousarray(coords[:, 0]),
+                                  'ys': np.ascontiguousarray(coords[:, 1]),
+                                  'zs': np.ascontiguousarray(coords[:, 2])})
             max_len = max(max_len, len(coords))
 
     def update(n):
@@ -219,8 +266,8 @@ def save_trajectory_as_gif(all_poses, reference_frame, output_path, fps):
         for el in plot_elements:
             c = el['coords']
             idx = min(n, len(c) - 1)
-            el['line'].set_data(c[:idx+1, 0], c[:idx+1, 1])
-            el['line'].set_3d_properties(c[:idx+1, 2])
+            el['line'].set_data(el['xs'][:idx+1], el['ys'][:idx+1])
+            el['line'].set_3d_properties(el['zs'][:idx+1])
             el['point'].set_data([c[idx, 0]], [c[idx, 1]])
             el['point'].set_3d_properties([c[idx, 2]])
             artists.extend([el['line'], el['point']])